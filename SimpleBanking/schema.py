@@ -0,0 +1,111 @@
+"""
+OpenAPI schema for the SimpleBanking API.
+
+Introspecting every viewset is expensive, so the schema is rendered once into a JSON artifact named after a
+fingerprint of the modules that shape it (URLconf, views, serializers, models). Workers load that artifact
+instead of regenerating it; a changed module yields a new fingerprint and the artifact is rebuilt on first use.
+Run ``manage.py generate_schema`` at build or deploy time to have it ready before the first request.
+
+drf_yasg is only imported with this module, which the URLconf loads lazily on the first schema request.
+"""
+import hashlib
+import importlib
+import os
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.middleware.gzip import re_accepts_gzip
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+from django.views.decorators.http import condition
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson
+from drf_yasg.views import get_schema_view
+from rest_framework import permissions
+
+SCHEMA_VERSION = 'v1'
+# This module is included for schema_info, the title, description and version of the schema
+SCHEMA_SOURCE_MODULES = (__name__, settings.ROOT_URLCONF, 'banking.views', 'banking.serializers', 'banking.models')
+
+schema_info = openapi.Info(
+    title="Snippets API",
+    default_version=SCHEMA_VERSION,
+    description="Test description",
+    terms_of_service="https://www.google.com/policies/terms/",
+    contact=openapi.Contact(email="contact@snippets.local"),
+    license=openapi.License(name="BSD License"),
+)
+
+schema_view = get_schema_view(
+    schema_info,
+    public=True,
+    permission_classes=(permissions.AllowAny,),
+)
+
+swagger_ui = schema_view.with_ui('swagger', cache_timeout=0)
+
+
+def source_fingerprint():
+    digest = hashlib.sha256(SCHEMA_VERSION.encode())
+    for module_name in SCHEMA_SOURCE_MODULES:
+        digest.update(Path(importlib.import_module(module_name).__file__).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def artifact_path():
+    return Path(settings.SCHEMA_ARTIFACT_DIR) / f'openapi-{SCHEMA_VERSION}-{source_fingerprint()}.json'
+
+
+def generate_schema():
+    generator = schema_view.generator_class(schema_info, SCHEMA_VERSION)
+    return OpenAPICodecJson(validators=[]).encode(generator.get_schema(request=None, public=True))
+
+
+def write_schema_artifact():
+    path = artifact_path()
+    content = generate_schema()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+    tmp_path.write_bytes(content)
+    os.replace(tmp_path, path)
+    return path, content
+
+
+@lru_cache(maxsize=1)
+def load_schema():
+    """
+    Return the schema document in each content coding as ``{coding: (content, strong ETag)}``, building the
+    artifact if it is missing.
+    """
+    path = artifact_path()
+    try:
+        content = path.read_bytes()
+    except FileNotFoundError:
+        try:
+            path, content = write_schema_artifact()
+        except OSError:
+            # Read-only deployments still serve a schema, just generated once per worker.
+            content = generate_schema()
+    # Compressed here rather than by GZipMiddleware, which would weaken the ETag
+    compressed = compress_string(content)
+    return {
+        'identity': (content, hashlib.sha256(content).hexdigest()),
+        'gzip': (compressed, hashlib.sha256(compressed).hexdigest()),
+    }
+
+
+def schema_coding(request):
+    return 'gzip' if re_accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')) else 'identity'
+
+
+@condition(etag_func=lambda request: load_schema()[schema_coding(request)][1])
+def schema_json(request):
+    coding = schema_coding(request)
+    response = HttpResponse(load_schema()[coding][0], content_type='application/json')
+    if coding == 'gzip':
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    response['Cache-Control'] = 'no-cache'
+    return response
@@ -46,6 +46,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'corsheaders',
     'banking',
     'drf_yasg',
@@ -53,6 +54,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'banking.middleware.GZipMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -98,6 +100,80 @@ DATABASES = {
     }
 }
 
+# Cache
+# Shared by the web workers and the background commands (scheduler, shard recovery): cached analytics and
+# their invalidation, rate-limit buckets and cached sessions and users must agree across processes.
+
+REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    }
+}
+
+# Authentication
+# Sessions and users are served from the cache so authenticated requests need no auth queries;
+# revoked sessions and changed users stop being honoured within AUTH_CACHE_TIMEOUT seconds.
+
+AUTHENTICATION_BACKENDS = ['banking.backends.CachedModelBackend']
+SESSION_ENGINE = 'banking.sessions'
+AUTH_CACHE_TIMEOUT = 60
+
+# Worker processes used to hash passwords during bulk registration
+PASSWORD_HASHING_WORKERS = os.cpu_count()
+
+# API rate limiting
+# Every user (or anonymous client address) gets a token bucket; views weigh expensive endpoints
+# through `throttle_costs`. Buckets live in the shared default cache, so they hold across worker processes.
+
+REST_FRAMEWORK = {
+    'DEFAULT_THROTTLE_CLASSES': ['banking.throttling.TokenBucketThrottle'],
+    # Reverse proxies in front of the app. Anonymous clients are throttled by the address the last of them saw;
+    # with 0 (the app served directly, as in docker-compose) a client-supplied X-Forwarded-For is ignored.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '0')),
+}
+TOKEN_BUCKET_THROTTLE = {
+    'CAPACITY': 60,
+    'REFILL_RATE': 1,
+}
+# Concurrent PDF statement renders allowed per worker before answering 429
+STATEMENT_RENDER_CONCURRENCY = 2
+
+# Scheduled transfers
+# Runs are spread at random over this many seconds after their requested time so standing orders
+# sharing a due date do not all execute at once.
+SCHEDULER_SPREAD_WINDOW = 60 * 60
+
+# Live transaction events
+# Transfers publish their events on this Redis channel; every worker relays it to the streams it holds.
+EVENTS_CHANNEL = 'banking:events'
+
+# Event log
+# `manage.py relay_outbox` moves outbox events into append-only segment files here for downstream consumers.
+EVENT_LOG_DIR = BASE_DIR / 'eventlog'
+EVENT_LOG_SEGMENT_BYTES = 64 * 1024 * 1024
+
+# OpenAPI schema
+# The swagger UI loads the prebuilt schema artifact (see SimpleBanking/schema.py) instead of regenerating it.
+
+SCHEMA_ARTIFACT_DIR = BASE_DIR / 'openapi'
+SWAGGER_SETTINGS = {
+    'SPEC_URL': 'schema-json',
+}
+
+# Sharding
+# Accounts, transactions and their satellites live on the shard of their owner (see banking/sharding.py).
+# The SHARD_DATABASES environment variable lists extra databases on the same server, e.g. "shard0,shard1"; without it
+# everything stays on `default`. Migrate every shard with `manage.py migrate --database=<shard>`.
+
+SHARD_DATABASES = [name for name in os.getenv('SHARD_DATABASES', '').split(',') if name]
+for shard_name in SHARD_DATABASES:
+    DATABASES[shard_name] = dict(DATABASES['default'], NAME=shard_name)
+BANKING_SHARDS = SHARD_DATABASES or ['default']
+DATABASE_ROUTERS = ['banking.sharding.ShardRouter']
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -16,37 +16,40 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from drf_yasg import openapi
-from drf_yasg.views import get_schema_view
-from rest_framework import permissions
+from django.utils.module_loading import import_string
 from rest_framework.routers import DefaultRouter
 
-from banking.views import RegisterAPIView, LoginAPIView, ProfileUpdateView, LogoutAPIView, AccountViewSet, \
-    TransactionViewSet
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="Snippets API",
-        default_version='v1',
-        description="Test description",
-        terms_of_service="https://www.google.com/policies/terms/",
-        contact=openapi.Contact(email="contact@snippets.local"),
-        license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+from banking.views import RegisterAPIView, BulkRegisterAPIView, LoginAPIView, ProfileUpdateView, LogoutAPIView, \
+    AccountViewSet, TransactionViewSet, ScheduledTransferViewSet, transaction_events
+
+
+def lazy_view(dotted_path):
+    """Defer importing a view (and everything its module pulls in) until it serves its first request."""
+    view = None
+
+    def wrapper(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = import_string(dotted_path)
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
 
 router = DefaultRouter()
 router.register(r'accounts', AccountViewSet, basename='account')
 router.register(r'transactions', TransactionViewSet, basename='transaction')
+router.register(r'scheduled_transfers', ScheduledTransferViewSet, basename='scheduled-transfer')
 
 urlpatterns = [
     path('api/', include(router.urls)),
     path('admin/', admin.site.urls),
     path('api/register/', RegisterAPIView.as_view(), name='register'),
+    path('api/register/bulk/', BulkRegisterAPIView.as_view(), name='register-bulk'),
     path('api/login/', LoginAPIView.as_view(), name='login'),
     path('api/me/', ProfileUpdateView.as_view(), name='ProfileUpdate'),
     path('api/logout/', LogoutAPIView.as_view(), name='logout'),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+    path('api/events/', transaction_events, name='events'),
+    path('swagger/', lazy_view('SimpleBanking.schema.swagger_ui'), name='schema-swagger-ui'),
+    path('swagger.json', lazy_view('SimpleBanking.schema.schema_json'), name='schema-json'),
 ]
@@ -0,0 +1,78 @@
+import json
+import os
+from pathlib import Path
+
+SEGMENT_SUFFIX = '.log'
+
+
+class SegmentedLog:
+    """
+    Append-only log of JSON records on local disk.
+
+    Records are written one per line and numbered with consecutive offsets. The log is split into segment
+    files named after the offset of their first record, and a new segment starts once the active one
+    reaches `segment_bytes`, so old segments can be archived or deleted as a whole and readers can seek
+    to an offset by picking the right file.
+    """
+
+    def __init__(self, directory, segment_bytes):
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        segments = self.segments()
+        if segments:
+            self.active_base = segments[-1]
+            self.next_offset = self.active_base + self._recover(self.segment_path(self.active_base))
+        else:
+            self.active_base = self.next_offset = 0
+
+    def segment_path(self, base_offset):
+        return self.directory / f'{base_offset:020d}{SEGMENT_SUFFIX}'
+
+    def segments(self):
+        return sorted(int(path.stem) for path in self.directory.glob(f'*{SEGMENT_SUFFIX}'))
+
+    @staticmethod
+    def _recover(path):
+        """Drop a record torn by a crash mid-write and return the number of complete records."""
+        content = path.read_bytes()
+        complete = content[:content.rfind(b'\n') + 1]
+        if len(complete) != len(content):
+            with open(path, 'r+b') as segment:
+                segment.truncate(len(complete))
+        return complete.count(b'\n')
+
+    def append(self, records):
+        """Append records durably (fsync'd before returning) and return the offset of the first one."""
+        first_offset = self.next_offset
+        path = self.segment_path(self.active_base)
+        segment = open(path, 'ab')
+        try:
+            for record in records:
+                if segment.tell() >= self.segment_bytes:
+                    segment.flush()
+                    os.fsync(segment.fileno())
+                    segment.close()
+                    self.active_base = self.next_offset
+                    segment = open(self.segment_path(self.active_base), 'ab')
+                line = json.dumps(dict(record, offset=self.next_offset), separators=(',', ':'))
+                segment.write(line.encode() + b'\n')
+                self.next_offset += 1
+            segment.flush()
+            os.fsync(segment.fileno())
+        finally:
+            segment.close()
+        return first_offset
+
+    def read(self, offset=0):
+        """Yield the records from `offset` onwards."""
+        segments = self.segments()
+        start = max((base for base in segments if base <= offset), default=0)
+        for base in segments:
+            if base < start:
+                continue
+            with open(self.segment_path(base), 'rb') as segment:
+                for position, line in enumerate(segment, start=base):
+                    if position >= offset and line.endswith(b'\n'):
+                        yield json.loads(line)
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds the listener waits before reconnecting to Redis
+LISTENER_RETRY = 1
+
+
+class EventBroker:
+    """Fan-out of account events to the streams opened on every worker.
+
+    Events are published on a Redis channel, so a transfer committed by any process (a web worker, the
+    scheduler, the shard recovery command) reaches the streams of every worker. Each worker relays the
+    channel to its own streams from a listener thread started with its first stream.
+
+    Streams live on the ASGI event loop while events arrive on the listener thread, so delivery is handed
+    over to the loop of each subscriber with ``call_soon_threadsafe``.
+    """
+
+    def __init__(self, max_queued=100):
+        self.max_queued = max_queued
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(dict)
+        self._client = None
+        self._listener = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = redis.Redis.from_url(settings.REDIS_URL)
+        return self._client
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(maxsize=self.max_queued)
+        with self._lock:
+            self._subscribers[user_id][queue] = asyncio.get_running_loop()
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='event-broker', daemon=True)
+                self._listener.start()
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.pop(queue, None)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, user_id, event):
+        """Send `event` to the streams of `user_id` on every worker. Events published while Redis is down are lost."""
+        try:
+            self.client.publish(settings.EVENTS_CHANNEL, json.dumps({'user_id': user_id, 'event': event}))
+        except redis.RedisError:
+            logger.warning("Could not publish an event for user %s", user_id, exc_info=True)
+
+    def deliver(self, user_id, event):
+        """Hand `event` to the streams of `user_id` opened on this worker."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, {}).items())
+        for queue, loop in subscribers:
+            loop.call_soon_threadsafe(self._enqueue, queue, event)
+
+    def _listen(self):
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(settings.EVENTS_CHANNEL)
+                for message in pubsub.listen():
+                    published = json.loads(message['data'])
+                    self.deliver(published['user_id'], published['event'])
+            except Exception:
+                # Streams must keep working after a Redis restart, so the listener never gives up.
+                logger.warning("Lost the event channel, reconnecting", exc_info=True)
+                time.sleep(LISTENER_RETRY)
+            finally:
+                pubsub.close()
+
+    @staticmethod
+    def _enqueue(queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A stalled client only loses events; it resyncs from the REST API on reconnect.
+            pass
+
+
+broker = EventBroker()
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from SimpleBanking.schema import write_schema_artifact
+
+
+class Command(BaseCommand):
+    help = 'Renders the OpenAPI schema into its versioned JSON artifact'
+
+    def handle(self, *args, **options):
+        path, content = write_schema_artifact()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(content)} bytes to {path}"))
@@ -0,0 +1,84 @@
+import json
+import statistics
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from banking.sharding import shard_cursor
+from banking.views import ACCOUNT_LEGS_SQL, OPEN_ACCOUNTS_SQL
+
+# The layout before 0018_transfer: one row per leg, with the indexes it had. Rebuilt from the view in a
+# temporary table, so the comparison runs on the shard's actual data.
+LEGACY_TABLE = """
+    CREATE TEMPORARY TABLE legacy_transaction ON COMMIT DROP AS SELECT * FROM banking_transaction;
+    ALTER TABLE legacy_transaction ADD PRIMARY KEY (id);
+    CREATE INDEX ON legacy_transaction (date, id);
+    CREATE INDEX ON legacy_transaction (from_account_id, date);
+    CREATE INDEX ON legacy_transaction (to_account_id, date);
+    CREATE INDEX ON legacy_transaction USING gin (description gin_trgm_ops);
+    ANALYZE legacy_transaction;
+"""
+
+LISTING_SQL = """
+    SELECT t.id, t.date, t.amount, t.transaction_type, t.description, t.internal
+    FROM {source}
+    ORDER BY t.date DESC, t.id DESC
+    LIMIT 20
+"""
+
+OWNED_LEGS = ("{table} t WHERE t.from_account_id IN (" + OPEN_ACCOUNTS_SQL + ") "
+              "OR t.to_account_id IN (" + OPEN_ACCOUNTS_SQL + ")")
+
+# The latest page of a user's transactions, as read by each layout; every source takes the user id twice.
+READ_PATHS = {
+    'transfer legs': ACCOUNT_LEGS_SQL.format(accounts=OPEN_ACCOUNTS_SQL),
+    'transaction view': OWNED_LEGS.format(table='banking_transaction'),
+    'legacy table': OWNED_LEGS.format(table='legacy_transaction'),
+}
+
+
+class Command(BaseCommand):
+    help = ('Compares the storage and listing latency of the single-row transfer ledger with the previous '
+            'two-row transaction table, on the data of one shard. Nothing is written.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shard', default=settings.BANKING_SHARDS[0], choices=settings.BANKING_SHARDS)
+        parser.add_argument('--users', type=int, default=50, help='Users whose listing is timed')
+        parser.add_argument('--runs', type=int, default=3, help='Timed runs per user and read path')
+
+    def handle(self, *args, **options):
+        alias = options['shard']
+        with transaction.atomic(using=alias), shard_cursor(alias) as cursor:
+            cursor.execute(LEGACY_TABLE)
+
+            for table in ('banking_transfer', 'legacy_transaction'):
+                cursor.execute("SELECT pg_table_size(%s), pg_indexes_size(%s), "
+                               "(SELECT COUNT(*) FROM " + table + ")", [table, table])
+                heap, indexes, rows = cursor.fetchone()
+                self.stdout.write(f"{table}: {rows} rows, {heap / 2 ** 20:.1f} MiB table + "
+                                  f"{indexes / 2 ** 20:.1f} MiB indexes = {(heap + indexes) / 2 ** 20:.1f} MiB")
+
+            cursor.execute("SELECT DISTINCT user_id FROM banking_account WHERE closed_at IS NULL "
+                           "ORDER BY user_id LIMIT %s", [options['users']])
+            users = [row[0] for row in cursor.fetchall()]
+            if not users:
+                raise CommandError(f"Shard {alias} has no open accounts")
+
+            for name, source in READ_PATHS.items():
+                sql = "EXPLAIN (ANALYZE, FORMAT JSON) " + LISTING_SQL.format(source=source)
+                samples = []
+                for user_id in users:
+                    # The first run warms the buffer cache and is not counted
+                    for run in range(options['runs'] + 1):
+                        cursor.execute(sql, [user_id, user_id])
+                        plan = cursor.fetchone()[0]
+                        if isinstance(plan, str):
+                            plan = json.loads(plan)
+                        if run:
+                            samples.append(plan[0]['Execution Time'])
+                self.stdout.write(f"{name}: median {statistics.median(samples):.2f} ms, "
+                                  f"p95 {statistics.quantiles(samples, n=20)[-1]:.2f} ms "
+                                  f"({len(users)} users x {options['runs']} runs)")
+
+            transaction.set_rollback(True, using=alias)
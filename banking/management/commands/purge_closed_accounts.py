@@ -0,0 +1,66 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from banking.sharding import shard_cursor
+
+
+class Command(BaseCommand):
+    help = 'Removes closed accounts, detaching their transfers in small batches first'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Transfers detached per batch')
+        parser.add_argument('--pause', type=float, default=0.1,
+                            help='Seconds to sleep between batches')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for newly closed accounts')
+        parser.add_argument('--interval', type=float, default=60,
+                            help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            for alias in settings.BANKING_SHARDS:
+                with shard_cursor(alias) as cursor:
+                    cursor.execute("SELECT id FROM banking_account WHERE closed_at IS NOT NULL ORDER BY closed_at")
+                    account_ids = [row[0] for row in cursor.fetchall()]
+
+                for account_id in account_ids:
+                    self.purge_account(alias, account_id, options['batch_size'], options['pause'])
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def purge_account(self, alias, account_id, batch_size, pause):
+        purged = 0
+        # Each column is drained separately so every batch is served by that column's index. Transfers with
+        # another account on the other side keep it: only the closed account's side is cleared.
+        for column, other in (('from_account_id', 'to_account_id'), ('to_account_id', 'from_account_id')):
+            while True:
+                with transaction.atomic(using=alias), shard_cursor(alias) as cursor:
+                    cursor.execute(f"""
+                        DELETE FROM banking_transfer
+                        WHERE id IN (SELECT id FROM banking_transfer WHERE {column} = %s AND {other} IS NULL LIMIT %s)
+                    """, [account_id, batch_size])
+                    deleted = cursor.rowcount
+                    cursor.execute(f"""
+                        UPDATE banking_transfer SET {column} = NULL
+                        WHERE id IN (SELECT id FROM banking_transfer WHERE {column} = %s LIMIT %s)
+                    """, [account_id, batch_size - deleted])
+                    deleted += cursor.rowcount
+                purged += deleted
+                if deleted:
+                    self.stdout.write(f"Account {account_id}: {purged} transfers purged")
+                if deleted < batch_size:
+                    break
+                time.sleep(pause)
+
+        # Standing orders of the account were deactivated when it was closed; the foreign key has no
+        # ON DELETE clause, so they must go before the account.
+        with transaction.atomic(using=alias), shard_cursor(alias) as cursor:
+            cursor.execute("DELETE FROM banking_scheduledtransfer WHERE from_account_id = %s", [account_id])
+            cursor.execute("DELETE FROM banking_account WHERE id = %s AND closed_at IS NOT NULL", [account_id])
+        self.stdout.write(self.style.SUCCESS(f"Account {account_id} purged ({purged} transfers)"))
@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from banking.sharding import shard_cursor
+from banking.transfers import complete_shard_transfer
+
+
+class Command(BaseCommand):
+    help = 'Settles cross-shard transfers left half-done by a crash or an unreachable shard'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--age', type=float, default=60,
+                            help='Seconds a transfer must have been pending before it is retried')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for pending transfers')
+        parser.add_argument('--interval', type=float, default=30,
+                            help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            for alias in settings.BANKING_SHARDS:
+                with shard_cursor(alias) as cursor:
+                    cursor.execute("""
+                        SELECT id FROM banking_shardtransfer
+                        WHERE status = 'debited' AND updated_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+                        ORDER BY updated_at
+                    """, [options['age']])
+                    transfer_ids = [row[0] for row in cursor.fetchall()]
+
+                for transfer_id in transfer_ids:
+                    try:
+                        outcome = complete_shard_transfer(transfer_id, alias)
+                    except Exception as exc:
+                        self.stderr.write(f"Transfer {transfer_id}: {exc}")
+                    else:
+                        self.stdout.write(f"Transfer {transfer_id}: {outcome}")
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
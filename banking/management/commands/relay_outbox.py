@@ -0,0 +1,69 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from banking.eventlog import SegmentedLog
+from banking.sharding import shard_cursor
+
+# pg advisory lock key, taken on every shard, making sure a single relay appends to each log
+RELAY_LOCK_ID = 0x6f7574626f78
+
+
+class Command(BaseCommand):
+    help = 'Moves outbox events, in order, into the segmented event log of their shard'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Events moved per transaction')
+        parser.add_argument('--interval', type=float, default=1,
+                            help='Seconds to wait when the outbox is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the outbox once and exit')
+
+    def handle(self, *args, **options):
+        logs = {}
+        for alias in settings.BANKING_SHARDS:
+            with shard_cursor(alias) as cursor:
+                cursor.execute("SELECT pg_try_advisory_lock(%s)", [RELAY_LOCK_ID])
+                if not cursor.fetchone()[0]:
+                    raise CommandError("Another outbox relay is already running")
+            # Outbox ids are only ordered within a shard, so every shard gets its own log.
+            directory = settings.EVENT_LOG_DIR if alias == 'default' else settings.EVENT_LOG_DIR / alias
+            logs[alias] = SegmentedLog(directory, settings.EVENT_LOG_SEGMENT_BYTES)
+
+        while True:
+            relayed = 0
+            for alias, log in logs.items():
+                batch = self.relay_batch(alias, log, options['batch_size'])
+                if batch:
+                    self.stdout.write(f"Relayed {batch} events from {alias}, log at offset {log.next_offset}")
+                relayed += batch
+            if not relayed:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+
+    def relay_batch(self, alias, log, batch_size):
+        # Events are appended (and fsync'd) before they are deleted, so a crash in between replays them:
+        # delivery is at-least-once and consumers deduplicate on the outbox `id`.
+        with transaction.atomic(using=alias), shard_cursor(alias) as cursor:
+            cursor.execute("""
+                SELECT id, event_type, created_at, payload FROM banking_outboxevent
+                ORDER BY id
+                LIMIT %s
+            """, [batch_size])
+            rows = cursor.fetchall()
+            if not rows:
+                return 0
+
+            log.append({
+                'id': event_id,
+                'type': event_type,
+                'created_at': created_at.isoformat(),
+                'payload': json.loads(payload) if isinstance(payload, str) else payload,
+            } for event_id, event_type, created_at, payload in rows)
+            cursor.execute("DELETE FROM banking_outboxevent WHERE id = ANY(%s)", [[row[0] for row in rows]])
+        return len(rows)
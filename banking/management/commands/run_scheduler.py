@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from banking.scheduling import run_due_transfers
+
+
+class Command(BaseCommand):
+    help = 'Executes due scheduled transfers in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10,
+                            help='Scheduled transfers claimed (and kept locked) per transaction')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Seconds to wait when nothing is due')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the due transfers once and exit')
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                processed = run_due_transfers(options['batch_size'])
+            except Exception as exc:
+                if options['once']:
+                    raise
+                self.stderr.write(f"Scheduler run failed: {exc}")
+                time.sleep(options['interval'])
+                continue
+            if processed:
+                self.stdout.write(f"Executed {processed} scheduled transfers")
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['interval'])
@@ -0,0 +1,84 @@
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from banking.models import Account, Transaction
+from banking.serializers import TransactionRowEncoder, TransactionSerializer
+
+# Columns in the order TRANSACTION_ROWS_SQL selects them
+COLUMNS = ['id', 'date', 'amount', 'transaction_type', 'description', 'internal', 'from_account', 'to_account']
+
+
+def sample_rows(count, seed=0):
+    """Listing rows as the cursor returns them: a withdrawal or a deposit leg of one account."""
+    rng = random.Random(seed)
+    started = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for row_id in range(1, count + 1):
+        account_number = rng.randint(10 ** 7, 10 ** 8 - 1)
+        withdrawal = rng.random() < 0.5
+        rows.append((
+            row_id,
+            started + timedelta(seconds=rng.randint(0, 365 * 24 * 3600), microseconds=rng.randint(0, 999999)),
+            Decimal(rng.randint(1, 10 ** 7)) / 100,
+            Transaction.WITHDRAWAL if withdrawal else Transaction.DEPOSIT,
+            rng.choice([None, 'Rent', 'Groceries', 'Salary', 'Transfer to savings']),
+            rng.random() < 0.3,
+            account_number if withdrawal else None,
+            None if withdrawal else account_number,
+        ))
+    return rows
+
+
+def serializer_path(rows):
+    """The previous path: model instances rendered field by field through TransactionSerializer."""
+    transactions = []
+    for row in rows:
+        values = dict(zip(COLUMNS, row))
+        from_number, to_number = values.pop('from_account'), values.pop('to_account')
+        transaction = Transaction(**values)
+        transaction.from_account = Account(account_number=from_number) if from_number else None
+        transaction.to_account = Account(account_number=to_number) if to_number else None
+        transactions.append(transaction)
+    return JSONRenderer().render(TransactionSerializer(transactions, many=True).data)
+
+
+def encoder_path(rows):
+    return JSONRenderer().render(TransactionRowEncoder(COLUMNS).encode(rows))
+
+
+class Command(BaseCommand):
+    help = 'Compares rendering a transaction page through TransactionSerializer and TransactionRowEncoder'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Rows per page')
+        parser.add_argument('--runs', type=int, default=20)
+        parser.add_argument('--min-speedup', type=float,
+                            help='Fail when the encoder is not at least this many times faster')
+
+    def handle(self, *args, **options):
+        rows = sample_rows(options['rows'])
+        if serializer_path(rows) != encoder_path(rows):
+            raise CommandError("The encoder output differs from the serializer output")
+
+        # Account lookups of the previous path are not counted: its accounts are prebuilt in memory.
+        timings = {}
+        for name, path in (('serializer', serializer_path), ('encoder', encoder_path)):
+            samples = []
+            for _ in range(options['runs']):
+                started = time.perf_counter()
+                path(rows)
+                samples.append(time.perf_counter() - started)
+            timings[name] = statistics.median(samples)
+            self.stdout.write(f"{name}: {timings[name] * 1000:.1f} ms per {len(rows)} rows "
+                              f"(median of {options['runs']})")
+
+        speedup = timings['serializer'] / timings['encoder']
+        self.stdout.write(f"Speedup: {speedup:.1f}x, output byte-identical")
+        if options['min_speedup'] is not None and speedup < options['min_speedup']:
+            raise CommandError(f"Speedup {speedup:.1f}x is below {options['min_speedup']}x")
@@ -0,0 +1,74 @@
+import json
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter: boots the WSGI application and serves one request, the way a new worker would.
+COLD_START_SCRIPT = """
+import json, os, resource, sys, time
+from wsgiref.util import setup_testing_defaults
+
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'SimpleBanking.settings')
+from django.core.wsgi import get_wsgi_application
+
+application = get_wsgi_application()
+environ = {'PATH_INFO': sys.argv[1], 'REQUEST_METHOD': 'GET'}
+setup_testing_defaults(environ)
+statuses = []
+body = b''.join(application(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+elapsed = time.perf_counter() - started
+
+print(json.dumps({
+    'status': statuses[0],
+    'body': body[:500].decode(errors='replace'),
+    'seconds': elapsed,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'heavy_modules': sorted({name.split('.')[0] for name in sys.modules if name.startswith(%r)}),
+}))
+"""
+
+HEAVY_MODULES = ('reportlab', 'drf_yasg.views', 'drf_yasg.generators')
+
+
+class Command(BaseCommand):
+    help = 'Measures worker cold start (boot to first served request) and resident memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--path', default='/api/login/',
+                            help='Request served after boot; the default needs no database, only the cache '
+                                 '(Redis at REDIS_URL) used by the rate limiting')
+        parser.add_argument('--max-seconds', type=float,
+                            help='Fail when the median cold start exceeds this many seconds')
+        parser.add_argument('--max-rss-mb', type=float,
+                            help='Fail when the median resident memory exceeds this many megabytes')
+
+    def handle(self, *args, **options):
+        script = COLD_START_SCRIPT % (HEAVY_MODULES,)
+        results = []
+        for _ in range(options['runs']):
+            completed = subprocess.run([sys.executable, '-c', script, options['path']], cwd=settings.BASE_DIR,
+                                       capture_output=True, text=True)
+            if completed.returncode:
+                raise CommandError(completed.stderr)
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            # Timing an error page would let a broken boot pass the gate
+            if not result['status'].startswith('2'):
+                raise CommandError(f"{options['path']} answered {result['status']}: {result['body']}")
+            results.append(result)
+
+        seconds = statistics.median(result['seconds'] for result in results)
+        rss_mb = statistics.median(result['rss_mb'] for result in results)
+        self.stdout.write(f"First request: {results[0]['status']}")
+        self.stdout.write(f"Cold start to first request: {seconds * 1000:.0f} ms (median of {len(results)})")
+        self.stdout.write(f"Resident memory: {rss_mb:.1f} MB")
+        self.stdout.write(f"Heavy modules loaded: {', '.join(results[0]['heavy_modules']) or 'none'}")
+
+        if options['max_seconds'] is not None and seconds > options['max_seconds']:
+            raise CommandError(f"Cold start {seconds:.3f}s exceeds {options['max_seconds']}s")
+        if options['max_rss_mb'] is not None and rss_mb > options['max_rss_mb']:
+            raise CommandError(f"Resident memory {rss_mb:.1f} MB exceeds {options['max_rss_mb']} MB")
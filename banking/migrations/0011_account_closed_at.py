@@ -0,0 +1,22 @@
+# Generated by Django 4.2 on 2026-10-19 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0010_alter_transaction_description'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='closed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='account',
+            index=models.Index(condition=models.Q(('closed_at__isnull', False)), fields=['closed_at'], name='banking_account_closed_idx'),
+        ),
+    ]
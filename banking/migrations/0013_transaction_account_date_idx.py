@@ -0,0 +1,32 @@
+# Generated by Django 4.2 on 2026-10-19 15:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0012_transaction_date_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['from_account', 'date'], name='banking_txn_from_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['to_account', 'date'], name='banking_txn_to_date_idx'),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='from_account',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='transactions_made', to='banking.account', verbose_name='From Account'),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='to_account',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='transactions_received', to='banking.account', verbose_name='To Account'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2 on 2026-10-19 15:44
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0013_transaction_account_date_idx'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['description'], name='banking_txn_description_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2 on 2026-10-19 15:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0014_transaction_description_trgm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledTransfer',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('description', models.CharField(blank=True, max_length=25, null=True)),
+                ('interval', models.CharField(choices=[('once', 'Once'), ('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly')], default='once', max_length=10)),
+                ('next_run_at', models.DateTimeField()),
+                ('due_at', models.DateTimeField()),
+                ('active', models.BooleanField(default=True)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('last_status', models.CharField(blank=True, choices=[('succeeded', 'Succeeded'), ('failed', 'Failed')], max_length=10, null=True)),
+                ('last_error', models.CharField(blank=True, max_length=255, null=True)),
+                ('from_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scheduled_transfers_made', to='banking.account', verbose_name='From Account')),
+                ('to_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scheduled_transfers_received', to='banking.account', verbose_name='To Account')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scheduled_transfers', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Scheduled transfer',
+                'verbose_name_plural': 'Scheduled transfers',
+                'ordering': ['next_run_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='scheduledtransfer',
+            index=models.Index(condition=models.Q(('active', True)), fields=['due_at'], name='banking_scheduled_due_idx'),
+        ),
+    ]
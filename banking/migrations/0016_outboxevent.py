@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-19 15:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0015_scheduledtransfer'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('event_type', models.CharField(choices=[('transfer.created', 'Transfer created'), ('account.created', 'Account created'), ('account.closed', 'Account closed')], max_length=50)),
+                ('payload', models.JSONField()),
+            ],
+            options={
+                'verbose_name': 'Outbox event',
+                'verbose_name_plural': 'Outbox events',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0016_outboxevent'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='account',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='accounts', to=settings.AUTH_USER_MODEL, verbose_name='Account holder'),
+        ),
+        migrations.AlterField(
+            model_name='scheduledtransfer',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='scheduled_transfers', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='scheduledtransfer',
+            name='to_account_number',
+            field=models.IntegerField(null=True, verbose_name='To Account'),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE banking_scheduledtransfer s SET to_account_number = a.account_number
+            FROM banking_account a WHERE s.to_account_id = a.id
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='scheduledtransfer',
+            name='to_account_number',
+            field=models.IntegerField(verbose_name='To Account'),
+        ),
+        migrations.RemoveField(
+            model_name='scheduledtransfer',
+            name='to_account',
+        ),
+        migrations.CreateModel(
+            name='ShardTransfer',
+            fields=[
+                ('id', models.UUIDField(primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('debited', 'Debited'), ('credited', 'Credited'), ('completed', 'Completed'), ('compensated', 'Compensated')], max_length=12)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('description', models.CharField(blank=True, max_length=25, null=True)),
+                ('from_account_number', models.IntegerField()),
+                ('to_account_number', models.IntegerField()),
+                ('from_user_id', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Shard transfer',
+                'verbose_name_plural': 'Shard transfers',
+                'indexes': [models.Index(condition=models.Q(('status', 'debited')), fields=['updated_at'], name='banking_shardtransfer_open_idx')],
+            },
+        ),
+    ]
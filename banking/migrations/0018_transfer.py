@@ -0,0 +1,150 @@
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+# Transfers written by the API are a withdrawal immediately followed by a matching deposit; they are
+# folded into one row. Anything else (seeded rows, cross-shard legs) is carried over as it is.
+FOLD_TRANSACTIONS = """
+    WITH pairs AS (
+        SELECT w.id AS withdrawal_id, d.id AS deposit_id
+        FROM banking_transaction w
+        JOIN banking_transaction d ON d.id = w.id + 1
+        WHERE w.transaction_type = 'withdrawal' AND w.to_account_id IS NULL
+        AND d.transaction_type = 'deposit' AND d.from_account_id IS NULL
+        AND d.amount = w.amount AND d.date = w.date AND d.internal = w.internal
+        AND d.description IS NOT DISTINCT FROM w.description
+    )
+    INSERT INTO banking_transfer (date, amount, description, internal, from_account_id, to_account_id)
+    SELECT date, amount, description, internal, from_account_id, to_account_id FROM (
+        SELECT w.id, w.date, w.amount, w.description, w.internal, w.from_account_id, d.to_account_id
+        FROM pairs
+        JOIN banking_transaction w ON w.id = pairs.withdrawal_id
+        JOIN banking_transaction d ON d.id = pairs.deposit_id
+        UNION ALL
+        SELECT t.id, t.date, t.amount, t.description, t.internal, t.from_account_id, t.to_account_id
+        FROM banking_transaction t
+        WHERE NOT EXISTS (SELECT 1 FROM pairs WHERE pairs.withdrawal_id = t.id)
+        AND NOT EXISTS (SELECT 1 FROM pairs WHERE pairs.deposit_id = t.id)
+    ) folded
+    ORDER BY id
+"""
+
+TRANSACTION_VIEW = """
+    DROP TABLE banking_transaction;
+    CREATE VIEW banking_transaction AS
+        SELECT t.id * 2 AS id, t.date, t.amount, 'withdrawal'::varchar(10) AS transaction_type, t.description,
+               t.internal, t.from_account_id, NULL::integer AS to_account_id
+        FROM banking_transfer t
+        WHERE t.from_account_id IS NOT NULL
+        UNION ALL
+        SELECT t.id * 2 + 1, t.date, t.amount, 'deposit', t.description,
+               t.internal, NULL, t.to_account_id
+        FROM banking_transfer t
+        WHERE t.to_account_id IS NOT NULL;
+"""
+
+# Back to one row per leg, keeping the leg ids the view exposed
+TRANSACTION_TABLE = """
+    DROP VIEW banking_transaction;
+    CREATE TABLE banking_transaction (
+        id integer NOT NULL GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        date timestamp with time zone NOT NULL,
+        amount numeric(12, 2) NOT NULL,
+        transaction_type varchar(10) NOT NULL,
+        description varchar(25),
+        from_account_id integer,
+        to_account_id integer,
+        internal boolean NOT NULL
+    );
+    INSERT INTO banking_transaction (id, date, amount, transaction_type, description, internal, from_account_id,
+                                     to_account_id)
+    SELECT t.id * 2, t.date, t.amount, 'withdrawal', t.description, t.internal, t.from_account_id, NULL
+    FROM banking_transfer t
+    WHERE t.from_account_id IS NOT NULL
+    UNION ALL
+    SELECT t.id * 2 + 1, t.date, t.amount, 'deposit', t.description, t.internal, NULL, t.to_account_id
+    FROM banking_transfer t
+    WHERE t.to_account_id IS NOT NULL;
+    SELECT setval(pg_get_serial_sequence('banking_transaction', 'id'), COALESCE(MAX(id), 0) + 1, false)
+    FROM banking_transaction;
+    ALTER TABLE banking_transaction
+        ADD CONSTRAINT banking_transaction_from_account_id_30f3bcd6_fk_banking_a FOREIGN KEY (from_account_id)
+            REFERENCES banking_account (id) DEFERRABLE INITIALLY DEFERRED,
+        ADD CONSTRAINT banking_transaction_to_account_id_d9c84431_fk_banking_a FOREIGN KEY (to_account_id)
+            REFERENCES banking_account (id) DEFERRABLE INITIALLY DEFERRED;
+    CREATE INDEX banking_transaction_date_idx ON banking_transaction (date, id);
+    CREATE INDEX banking_txn_from_date_idx ON banking_transaction (from_account_id, date);
+    CREATE INDEX banking_txn_to_date_idx ON banking_transaction (to_account_id, date);
+    CREATE INDEX banking_txn_description_trgm ON banking_transaction USING gin (description gin_trgm_ops);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0017_sharding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Transfer',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('description', models.CharField(blank=True, max_length=25, null=True)),
+                ('internal', models.BooleanField(default=False)),
+                ('from_account', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transfers_made', to='banking.account', verbose_name='From Account')),
+                ('to_account', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transfers_received', to='banking.account', verbose_name='To Account')),
+            ],
+            options={
+                'verbose_name': 'Transfer',
+                'verbose_name_plural': 'Transfers',
+                'ordering': ['-date'],
+            },
+        ),
+        # Rows are folded before the indexes are built. Reversing unfolds them when the view is turned back
+        # into a table, before banking_transfer is dropped.
+        migrations.RunSQL(FOLD_TRANSACTIONS, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='transfer',
+            index=models.Index(fields=['date', 'id'], name='banking_transfer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transfer',
+            index=models.Index(fields=['from_account', 'date'], name='banking_transfer_from_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transfer',
+            index=models.Index(fields=['to_account', 'date'], name='banking_transfer_to_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transfer',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['description'], name='banking_transfer_desc_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunSQL(TRANSACTION_VIEW, TRANSACTION_TABLE)],
+            state_operations=[
+                migrations.RemoveIndex(model_name='transaction', name='banking_transaction_date_idx'),
+                migrations.RemoveIndex(model_name='transaction', name='banking_txn_from_date_idx'),
+                migrations.RemoveIndex(model_name='transaction', name='banking_txn_to_date_idx'),
+                migrations.RemoveIndex(model_name='transaction', name='banking_txn_description_trgm'),
+                migrations.AlterField(
+                    model_name='transaction',
+                    name='from_account',
+                    field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='transactions_made', to='banking.account', verbose_name='From Account'),
+                ),
+                migrations.AlterField(
+                    model_name='transaction',
+                    name='to_account',
+                    field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='transactions_received', to='banking.account', verbose_name='To Account'),
+                ),
+                migrations.AlterModelTable(name='transaction', table='banking_transaction'),
+                migrations.AlterModelOptions(
+                    name='transaction',
+                    options={'managed': False, 'ordering': ['-date'], 'verbose_name': 'Transaction', 'verbose_name_plural': 'Transactions'},
+                ),
+            ],
+        ),
+    ]
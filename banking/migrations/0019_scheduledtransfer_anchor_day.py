@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-19 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0018_transfer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scheduledtransfer',
+            name='anchor_day',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        # Orders that already drifted keep their current day; there is no record of the original one.
+        migrations.RunSQL(
+            """
+            UPDATE banking_scheduledtransfer SET anchor_day = EXTRACT(DAY FROM next_run_at AT TIME ZONE 'UTC')
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='scheduledtransfer',
+            name='anchor_day',
+            field=models.PositiveSmallIntegerField(),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0019_scheduledtransfer_anchor_day'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outboxevent',
+            name='event_type',
+            field=models.CharField(choices=[('transfer.created', 'Transfer created'), ('transfer.debited', 'Transfer debited'), ('transfer.reversed', 'Transfer reversed'), ('account.created', 'Account created'), ('account.closed', 'Account closed')], max_length=50),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.models import AbstractUser, Group, Permission
+from django.contrib.postgres.indexes import GinIndex
 from django.db import models
+from django.utils import timezone
 
 from SimpleBanking import settings
 
@@ -41,11 +43,14 @@ class Account(models.Model):
     balance = models.DecimalField(max_digits=12, decimal_places=2)
     type = models.CharField(max_length=15, choices=ACCOUNT_TYPES, default=SAVINGS)
     account_number = models.IntegerField(max_length=20, unique=True)
+    closed_at = models.DateTimeField(null=True, blank=True)
 
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
         related_name='accounts',
+        # Owners live on the default database while accounts are sharded
+        db_constraint=False,
         verbose_name='Account holder'
     )
 
@@ -54,12 +59,65 @@ class Account(models.Model):
         verbose_name = 'Account'
         verbose_name_plural = 'Accounts'
         ordering = ['user', 'name']
+        indexes = [
+            models.Index(fields=['closed_at'], condition=models.Q(closed_at__isnull=False),
+                         name='banking_account_closed_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} Account #{self.account_number} (Owner: {self.user.username})"
 
 
+class Transfer(models.Model):
+    """
+    A movement of money between two accounts, stored once. The per-account legs (a withdrawal from
+    `from_account`, a deposit into `to_account`) are derived from it by the `banking_transaction` view.
+
+    A side is empty when that account lives on another shard or has been purged.
+    """
+    id = models.BigAutoField(primary_key=True)
+    date = models.DateTimeField(default=timezone.now)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    description = models.CharField(max_length=25, blank=True, null=True)
+    internal = models.BooleanField(default=False)
+
+    from_account = models.ForeignKey(
+        'Account',
+        on_delete=models.SET_NULL,
+        related_name='transfers_made',
+        db_index=False,
+        null=True,
+        blank=True,
+        verbose_name='From Account'
+    )
+    to_account = models.ForeignKey(
+        'Account',
+        on_delete=models.SET_NULL,
+        related_name='transfers_received',
+        db_index=False,
+        null=True,
+        blank=True,
+        verbose_name='To Account'
+    )
+
+    class Meta:
+        verbose_name = 'Transfer'
+        verbose_name_plural = 'Transfers'
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['date', 'id'], name='banking_transfer_date_idx'),
+            models.Index(fields=['from_account', 'date'], name='banking_transfer_from_date_idx'),
+            models.Index(fields=['to_account', 'date'], name='banking_transfer_to_date_idx'),
+            GinIndex(fields=['description'], opclasses=['gin_trgm_ops'], name='banking_transfer_desc_trgm'),
+        ]
+
+    def __str__(self):
+        internal_label = "Internal" if self.internal else "External"
+        return f"Transfer of ${self.amount} on {self.date.strftime('%Y-%m-%d')} ({internal_label})"
+
+
 class Transaction(models.Model):
+    """One leg of a Transfer, read from the `banking_transaction` view. Legs are written as Transfer rows."""
     DEPOSIT = 'deposit'
     WITHDRAWAL = 'withdrawal'
     TRANSFER = 'transfer'
@@ -78,22 +136,26 @@ class Transaction(models.Model):
 
     from_account = models.ForeignKey(
         'Account',
-        on_delete=models.CASCADE,
+        on_delete=models.DO_NOTHING,
         related_name='transactions_made',
+        db_index=False,
         null=True,
         blank=True,
         verbose_name='From Account'
     )
     to_account = models.ForeignKey(
         'Account',
-        on_delete=models.CASCADE,
+        on_delete=models.DO_NOTHING,
         related_name='transactions_received',
+        db_index=False,
         null=True,
         blank=True,
         verbose_name='To Account'
     )
 
     class Meta:
+        managed = False
+        db_table = 'banking_transaction'
         verbose_name = 'Transaction'
         verbose_name_plural = 'Transactions'
         ordering = ['-date']
@@ -101,3 +163,134 @@ class Transaction(models.Model):
     def __str__(self):
         internal_label = "Internal" if self.internal else "External"
         return f"{self.transaction_type.capitalize()} of ${self.amount} on {self.date.strftime('%Y-%m-%d')} ({internal_label})"
+
+
+class ScheduledTransfer(models.Model):
+    ONCE = 'once'
+    DAILY = 'daily'
+    WEEKLY = 'weekly'
+    MONTHLY = 'monthly'
+    INTERVALS = [
+        (ONCE, 'Once'),
+        (DAILY, 'Daily'),
+        (WEEKLY, 'Weekly'),
+        (MONTHLY, 'Monthly'),
+    ]
+
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUSES = [
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    description = models.CharField(max_length=25, blank=True, null=True)
+    interval = models.CharField(max_length=10, choices=INTERVALS, default=ONCE)
+    # When the customer asked for the transfer to run
+    next_run_at = models.DateTimeField()
+    # When the scheduler actually runs it: next_run_at shifted within SCHEDULER_SPREAD_WINDOW
+    due_at = models.DateTimeField()
+    # Day of the month (UTC) monthly orders come back to after being clamped to a shorter month
+    anchor_day = models.PositiveSmallIntegerField()
+    active = models.BooleanField(default=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    last_status = models.CharField(max_length=10, choices=STATUSES, null=True, blank=True)
+    last_error = models.CharField(max_length=255, null=True, blank=True)
+
+    # The destination may live on another shard, so it is referenced by number
+    to_account_number = models.IntegerField(verbose_name='To Account')
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='scheduled_transfers',
+        db_constraint=False,
+    )
+    from_account = models.ForeignKey(
+        'Account',
+        on_delete=models.CASCADE,
+        related_name='scheduled_transfers_made',
+        verbose_name='From Account'
+    )
+
+    class Meta:
+        verbose_name = 'Scheduled transfer'
+        verbose_name_plural = 'Scheduled transfers'
+        ordering = ['next_run_at']
+        indexes = [
+            models.Index(fields=['due_at'], condition=models.Q(active=True), name='banking_scheduled_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_interval_display()} transfer of ${self.amount} due {self.next_run_at.strftime('%Y-%m-%d')}"
+
+
+class OutboxEvent(models.Model):
+    TRANSFER_CREATED = 'transfer.created'
+    TRANSFER_DEBITED = 'transfer.debited'
+    TRANSFER_REVERSED = 'transfer.reversed'
+    ACCOUNT_CREATED = 'account.created'
+    ACCOUNT_CLOSED = 'account.closed'
+    EVENT_TYPES = [
+        (TRANSFER_CREATED, 'Transfer created'),
+        (TRANSFER_DEBITED, 'Transfer debited'),
+        (TRANSFER_REVERSED, 'Transfer reversed'),
+        (ACCOUNT_CREATED, 'Account created'),
+        (ACCOUNT_CLOSED, 'Account closed'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    event_type = models.CharField(max_length=50, choices=EVENT_TYPES)
+    payload = models.JSONField()
+
+    class Meta:
+        verbose_name = 'Outbox event'
+        verbose_name_plural = 'Outbox events'
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.event_type} #{self.id}"
+
+
+class ShardTransfer(models.Model):
+    """
+    Saga record of a transfer between accounts on different shards, kept on both of them.
+
+    The source shard records the debit ('debited') and later the outcome ('completed' or 'compensated');
+    the destination shard records whether it credited the transfer ('credited') or refused it ('compensated').
+    The destination row is written first and decides the outcome, which makes every step safe to retry.
+    """
+    DEBITED = 'debited'
+    CREDITED = 'credited'
+    COMPLETED = 'completed'
+    COMPENSATED = 'compensated'
+    STATUSES = [
+        (DEBITED, 'Debited'),
+        (CREDITED, 'Credited'),
+        (COMPLETED, 'Completed'),
+        (COMPENSATED, 'Compensated'),
+    ]
+
+    id = models.UUIDField(primary_key=True)
+    status = models.CharField(max_length=12, choices=STATUSES)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    description = models.CharField(max_length=25, blank=True, null=True)
+    from_account_number = models.IntegerField()
+    to_account_number = models.IntegerField()
+    from_user_id = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Shard transfer'
+        verbose_name_plural = 'Shard transfers'
+        indexes = [
+            models.Index(fields=['updated_at'], condition=models.Q(status='debited'),
+                         name='banking_shardtransfer_open_idx'),
+        ]
+
+    def __str__(self):
+        return f"Transfer {self.id} ({self.status})"
@@ -0,0 +1,13 @@
+import json
+
+
+def record_event(cursor, event_type, payload):
+    """
+    Queue an event for downstream consumers. Call it on the cursor of the transaction making the change:
+    the event is committed (or rolled back) together with it and later moved to the event log by
+    `manage.py relay_outbox`.
+    """
+    cursor.execute(
+        "INSERT INTO banking_outboxevent (created_at, event_type, payload) VALUES (CURRENT_TIMESTAMP, %s, %s)",
+        [event_type, json.dumps(payload)]
+    )
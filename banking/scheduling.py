@@ -0,0 +1,92 @@
+import calendar
+import logging
+import random
+from datetime import timedelta, timezone
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import ScheduledTransfer
+from .sharding import shard_cursor
+from .transfers import TransferError, execute_transfer
+
+logger = logging.getLogger(__name__)
+
+
+def spread(moment):
+    """Shift a requested run time by a random offset within SCHEDULER_SPREAD_WINDOW seconds."""
+    return moment + timedelta(seconds=random.uniform(0, settings.SCHEDULER_SPREAD_WINDOW))
+
+
+def anchor_day_of(moment):
+    """The day of the month of `moment` in UTC, the timezone run times are read back from the database in."""
+    return moment.astimezone(timezone.utc).day
+
+
+def next_occurrence(moment, interval, anchor_day):
+    if interval == ScheduledTransfer.DAILY:
+        return moment + timedelta(days=1)
+    if interval == ScheduledTransfer.WEEKLY:
+        return moment + timedelta(weeks=1)
+    if interval == ScheduledTransfer.MONTHLY:
+        year, month = (moment.year + 1, 1) if moment.month == 12 else (moment.year, moment.month + 1)
+        return moment.replace(year=year, month=month, day=min(anchor_day, calendar.monthrange(year, month)[1]))
+    return None
+
+
+def run_due_transfers(batch_size):
+    """
+    Claim up to `batch_size` due scheduled transfers on every shard, execute each through `execute_transfer`
+    and record the outcomes. Orders claimed by a concurrent scheduler are skipped rather than waited on.
+
+    Returns the number of orders processed.
+    """
+    return sum(run_shard_due_transfers(alias, batch_size) for alias in settings.BANKING_SHARDS)
+
+
+def run_shard_due_transfers(alias, batch_size):
+    with transaction.atomic(using=alias), shard_cursor(alias) as cursor:
+        cursor.execute("""
+            SELECT s.id, s.user_id, fa.account_number, s.to_account_number, s.amount, s.description,
+                   s.interval, s.next_run_at, s.anchor_day
+            FROM banking_scheduledtransfer s
+            JOIN banking_account fa ON s.from_account_id = fa.id
+            WHERE s.active AND s.due_at <= CURRENT_TIMESTAMP AND fa.closed_at IS NULL
+            ORDER BY s.due_at
+            LIMIT %s
+            FOR UPDATE OF s SKIP LOCKED
+        """, [batch_size])
+        orders = cursor.fetchall()
+        if not orders:
+            return 0
+
+        outcomes = []
+        for order_id, user_id, from_account_number, to_account_number, amount, description, interval, \
+                next_run_at, anchor_day in orders:
+            # Each order runs in its own savepoint, so a failing one is rolled back on its own and the
+            # rest of the batch still runs.
+            try:
+                with transaction.atomic(using=alias):
+                    execute_transfer(user_id, from_account_number, to_account_number, amount, description)
+                outcome, error = ScheduledTransfer.SUCCEEDED, None
+            except TransferError as exc:
+                outcome, error = ScheduledTransfer.FAILED, exc.message
+            except Exception as exc:
+                logger.exception("Scheduled transfer %s failed", order_id)
+                outcome, error = ScheduledTransfer.FAILED, (str(exc).strip() or type(exc).__name__)[:255]
+
+            following = next_occurrence(next_run_at, interval, anchor_day)
+            outcomes.extend([
+                order_id, outcome, error, following or next_run_at,
+                spread(following) if following else next_run_at, following is not None,
+            ])
+
+        cursor.execute("""
+            UPDATE banking_scheduledtransfer s
+            SET last_run_at = CURRENT_TIMESTAMP, last_status = v.status, last_error = v.error,
+                next_run_at = v.next_run_at, due_at = v.due_at, active = v.active
+            FROM (VALUES %s) AS v(id, status, error, next_run_at, due_at, active)
+            WHERE s.id = v.id
+        """ % ', '.join(['(%s::integer, %s, %s::varchar, %s::timestamptz, %s::timestamptz, %s::boolean)']
+                        * len(orders)), outcomes)
+    return len(orders)
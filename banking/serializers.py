@@ -1,8 +1,10 @@
 import random
+from decimal import Decimal
 
 from rest_framework import serializers
 
-from .models import User, Account, Transaction
+from .models import User, Account, Transaction, ScheduledTransfer
+from .sharding import shard_for_account_number, shard_for_user
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -29,22 +31,86 @@ class TransactionSerializer(serializers.ModelSerializer):
         fields = ('id', 'date', 'amount', 'transaction_type', 'description', 'internal', 'from_account', 'to_account')
 
     def to_internal_value(self, data):
-        from_account_number = data.get('from_account')
-        to_account_number = data.get('to_account')
+        # The accounts may live on different shards, so they are looked up by number on their own shard
+        # rather than by primary key.
+        accounts = {}
+        for field in ('from_account', 'to_account'):
+            try:
+                account_number = int(data.get(field))
+                accounts[field] = Account.objects.using(shard_for_account_number(account_number)) \
+                    .get(account_number=account_number, closed_at__isnull=True)
+            except (TypeError, ValueError, Account.DoesNotExist):
+                raise serializers.ValidationError("One or both accounts do not exist.")
 
-        try:
-            from_account = Account.objects.get(account_number=from_account_number)
-            to_account = Account.objects.get(account_number=to_account_number)
-        except Account.DoesNotExist:
-            raise serializers.ValidationError("One or both accounts do not exist.")
-
-        data['from_account'] = from_account.id
-        data['to_account'] = to_account.id
-
-        return super().to_internal_value(data)
+        validated_data = super().to_internal_value({key: value for key, value in data.items() if key not in accounts})
+        validated_data.update(accounts)
+        return validated_data
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         representation['from_account'] = instance.from_account.account_number if instance.from_account else None
         representation['to_account'] = instance.to_account.account_number if instance.to_account else None
         return representation
+
+
+class OwnAccountField(serializers.SlugRelatedField):
+    """An open account of the requesting user, looked up on the user's shard."""
+
+    def get_queryset(self):
+        request = self.context.get('request')
+        if request is None:
+            # e.g. while the API schema is generated
+            return Account.objects.none()
+        return Account.objects.using(shard_for_user(request.user.id)).filter(closed_at__isnull=True)
+
+
+class ScheduledTransferSerializer(serializers.ModelSerializer):
+    from_account = OwnAccountField(slug_field='account_number')
+    to_account = serializers.IntegerField(source='to_account_number')
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0.01'))
+
+    class Meta:
+        model = ScheduledTransfer
+        fields = ('id', 'from_account', 'to_account', 'amount', 'description', 'interval', 'next_run_at', 'active',
+                  'last_run_at', 'last_status', 'last_error')
+        read_only_fields = ('last_run_at', 'last_status', 'last_error')
+
+    def create(self, validated_data):
+        # Written to the owner's shard: the router has no instance to route a manager's create() by.
+        return ScheduledTransfer.objects.db_manager(shard_for_user(validated_data['user'].id)).create(**validated_data)
+
+    def validate_to_account(self, value):
+        if not Account.objects.using(shard_for_account_number(value)) \
+                .filter(account_number=value, closed_at__isnull=True).exists():
+            raise serializers.ValidationError("Account does not exist.")
+        return value
+
+
+class TransactionRowEncoder:
+    """Produces the same representation as TransactionSerializer straight from cursor rows.
+
+    Converters are resolved once per column from the serializer's own fields, so rows skip model
+    instantiation, per-field dispatch and the per-row account lookups of ``to_representation``.
+    Rows must carry the account numbers under ``from_account``/``to_account``.
+    """
+
+    def __init__(self, columns):
+        fields = TransactionSerializer().fields
+        self.columns = columns
+        self.converters = [
+            fields[column].to_representation
+            if isinstance(fields[column], (serializers.DateTimeField, serializers.DecimalField)) else None
+            for column in columns
+        ]
+
+    @classmethod
+    def from_cursor(cls, cursor):
+        return cls([column[0] for column in cursor.description])
+
+    def encode(self, rows):
+        columns = list(zip(self.columns, self.converters))
+        return [
+            {column: value if convert is None or value is None else convert(value)
+             for (column, convert), value in zip(columns, row)}
+            for row in rows
+        ]
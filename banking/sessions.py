@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+
+
+class SessionStore(CachedDBStore):
+    """
+    Cached, database backed sessions whose cache entries live at most AUTH_CACHE_TIMEOUT seconds.
+
+    A session revoked on one worker (logout, flush) is dropped from that worker's cache right away and
+    expires from every other worker's cache within the timeout, even when caches are per process.
+    """
+
+    def _cache_timeout(self, expiry_age):
+        return min(expiry_age, settings.AUTH_CACHE_TIMEOUT)
+
+    def load(self):
+        try:
+            data = self._cache.get(self.cache_key)
+        except Exception:
+            data = None
+
+        if data is None:
+            s = self._get_session_from_db()
+            if s:
+                data = self.decode(s.session_data)
+                self._cache.set(self.cache_key, data,
+                                self._cache_timeout(self.get_expiry_age(expiry=s.expire_date)))
+            else:
+                data = {}
+        return data
+
+    def save(self, must_create=False):
+        DBStore.save(self, must_create)
+        self._cache.set(self.cache_key, self._session, self._cache_timeout(self.get_expiry_age()))
@@ -0,0 +1,69 @@
+"""
+User-keyed sharding of the banking data.
+
+Users, sessions and the admin stay on the ``default`` database. Accounts, their transactions, scheduled
+transfers and outbox events live on the shard of the account owner: ``BANKING_SHARDS[user_id % shard count]``.
+Account numbers encode their shard (``account_number % shard count`` is the shard index), so a transfer
+can find the destination shard from the number alone. Changing the number of shards therefore requires
+moving data; with a single shard (the default) everything stays on ``default``.
+"""
+import random
+
+from django.conf import settings
+from django.db import connections
+
+SHARDED_MODELS = {'account', 'transfer', 'transaction', 'scheduledtransfer', 'outboxevent', 'shardtransfer'}
+
+
+def shard_for_user(user_id):
+    return settings.BANKING_SHARDS[int(user_id) % len(settings.BANKING_SHARDS)]
+
+
+def shard_for_account_number(account_number):
+    return settings.BANKING_SHARDS[int(account_number) % len(settings.BANKING_SHARDS)]
+
+
+def shard_cursor(alias):
+    return connections[alias].cursor()
+
+
+def generate_account_number(user_id):
+    """Random 8-digit account number that maps to the shard of `user_id`."""
+    shard_count = len(settings.BANKING_SHARDS)
+    number = random.randint(10 ** 7, 10 ** 8 - shard_count)
+    return number - number % shard_count + int(user_id) % shard_count
+
+
+class ShardRouter:
+    """Routes sharded banking models to their owner's shard and everything else to ``default``."""
+
+    @staticmethod
+    def is_sharded(model):
+        return model._meta.app_label == 'banking' and model._meta.model_name in SHARDED_MODELS
+
+    @classmethod
+    def shard_of(cls, instance):
+        if instance._meta.label_lower == settings.AUTH_USER_MODEL.lower():
+            # Rows owned by a user (or reached from one) live on the user's shard
+            return shard_for_user(instance.pk) if instance.pk is not None else None
+        if instance._state.db:
+            return instance._state.db
+        user_id = getattr(instance, 'user_id', None)
+        if user_id is not None:
+            return shard_for_user(user_id)
+        for field in ('from_account', 'to_account'):
+            if getattr(instance, f'{field}_id', None) is not None:
+                return getattr(instance, field)._state.db
+        return None
+
+    def db_for_read(self, model, **hints):
+        if not self.is_sharded(model):
+            return 'default'
+        instance = hints.get('instance')
+        return self.shard_of(instance) if instance is not None else None
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Sharded rows reference their owner on `default`.
+        return True
@@ -0,0 +1,54 @@
+from datetime import datetime
+from io import BytesIO
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
+
+
+def render_statement(transactions):
+    # Create a PDF buffer
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    elements = []
+
+    # Add title
+    styles = getSampleStyleSheet()
+    title = Paragraph("Transaction Statement", styles['Title'])
+    elements.append(title)
+
+    headers = ["ID", "Date", "Amount", "Type", "Description", "From Account", "To Account", "Internal"]
+    data = [headers] + [[
+        str(transaction['id']),
+        transaction['date'].strftime('%Y-%m-%d %H:%M:%S') if isinstance(transaction['date'], datetime) else str(
+            transaction['date']),
+        str(transaction['amount']),
+        str(transaction['transaction_type']),
+        str(transaction['description']),
+        str(transaction['from_account_number']),
+        str(transaction['to_account_number']),
+        str(transaction['internal'])
+    ] for transaction in transactions]
+
+    # Create table
+    table = Table(data)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ]))
+
+    # Add table to elements
+    elements.append(table)
+
+    # Build PDF
+    doc.build(elements)
+
+    buffer.seek(0)
+    return buffer
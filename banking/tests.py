@@ -1 +1,586 @@
-# Create your tests here.
+import asyncio
+import contextlib
+import gzip
+import json
+import queue
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from io import StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import EmptyResultSet
+from django.core.management import call_command
+from django.db import router
+from django.test import AsyncRequestFactory, SimpleTestCase, override_settings
+import redis
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from .events import EventBroker
+from .throttling import TokenBucketThrottle
+from .management.commands.serializer_benchmark import COLUMNS, encoder_path, sample_rows, serializer_path
+from .middleware import GZipMiddleware
+from .models import Account, OutboxEvent, ScheduledTransfer, ShardTransfer, User
+from .serializers import ScheduledTransferSerializer
+from .scheduling import anchor_day_of, next_occurrence, run_shard_due_transfers
+from .transfers import ANALYTICS_BUCKETS, TransferError, analytics_cache_key, complete_shard_transfer, \
+    execute_transfer, invalidate_analytics
+from .views import AccountViewSet, BulkRegisterAPIView, TransactionViewSet, parse_flag, transaction_events
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AnalyticsInvalidationTests(SimpleTestCase):
+    def test_transfer_invalidates_every_bucket_of_both_owners(self):
+        for user_id in (1, 2, 3):
+            for bucket in ANALYTICS_BUCKETS:
+                cache.set(analytics_cache_key(user_id, bucket), {'bucket': bucket})
+
+        invalidate_analytics(1, 2)
+
+        for bucket in ANALYTICS_BUCKETS:
+            self.assertIsNone(cache.get(analytics_cache_key(1, bucket)))
+            self.assertIsNone(cache.get(analytics_cache_key(2, bucket)))
+            self.assertIsNotNone(cache.get(analytics_cache_key(3, bucket)))
+
+    def test_closing_an_account_invalidates_its_owners_analytics(self):
+        cache.set(analytics_cache_key(1, 'month'), {'bucket': 'month'})
+        cursor = mock.MagicMock()
+        cursor.__enter__.return_value = cursor
+        cursor.fetchone.return_value = (10000001,)
+        request = APIRequestFactory().delete('/api/accounts/5/')
+        force_authenticate(request, user=SimpleNamespace(id=1, pk=1, is_authenticated=True))
+        with mock.patch('banking.views.shard_cursor', return_value=cursor), \
+                mock.patch('banking.views.transaction') as transaction:
+            transaction.on_commit.side_effect = lambda callback, using: callback()
+            response = AccountViewSet.as_view({'delete': 'destroy'})(request, pk='5')
+        self.assertEqual(response.status_code, 204)
+        self.assertIsNone(cache.get(analytics_cache_key(1, 'month')))
+
+
+class FakeRedis:
+    """The pub/sub part of one Redis server, shared by the brokers of several processes."""
+
+    def __init__(self):
+        self.listeners = []
+
+    def publish(self, channel, message):
+        for subscribed, messages in list(self.listeners):
+            if subscribed == channel:
+                messages.put({'type': 'message', 'channel': channel, 'data': message.encode()})
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self)
+
+
+class FakePubSub:
+    def __init__(self, server):
+        self.server = server
+        self.messages = queue.Queue()
+
+    def subscribe(self, channel):
+        self.server.listeners.append((channel, self.messages))
+
+    def listen(self):
+        while True:
+            yield self.messages.get()
+
+    def close(self):
+        pass
+
+
+def redis_broker(server):
+    broker = EventBroker()
+    broker._client = server
+    return broker
+
+
+class TransactionEventsTests(SimpleTestCase):
+    IDLE_STREAMS = 5000
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.broker = redis_broker(self.redis)
+        patcher = mock.patch('banking.views.broker', self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def events_request(self, user_id):
+        request = AsyncRequestFactory().get('/api/events/')
+        request.user = SimpleNamespace(id=user_id, is_authenticated=True)
+        return request
+
+    async def wait_for(self, predicate, timeout=10):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while not predicate():
+            self.assertLess(loop.time(), deadline, "Timed out waiting for the streams")
+            await asyncio.sleep(0.01)
+
+    async def test_thousands_of_idle_streams_receive_their_events_and_unsubscribe_on_disconnect(self):
+        received = {}
+
+        async def consume(response, user_id):
+            async for chunk in response:
+                received.setdefault(user_id, []).append(chunk)
+
+        consumers = []
+        for user_id in range(1, self.IDLE_STREAMS + 1):
+            response = await transaction_events(self.events_request(user_id))
+            consumers.append(asyncio.create_task(consume(response, user_id)))
+        await self.wait_for(lambda: self.broker.subscriber_count() == self.IDLE_STREAMS and self.redis.listeners)
+
+        # Published from another process, e.g. the scheduler
+        publisher = redis_broker(self.redis)
+        for user_id in range(1, self.IDLE_STREAMS + 1):
+            publisher.publish(user_id, {'type': 'transfer', 'to_account': user_id})
+        await self.wait_for(lambda: all(len(received.get(user_id, ())) == 2
+                                        for user_id in range(1, self.IDLE_STREAMS + 1)))
+
+        for user_id, (retry, event) in received.items():
+            self.assertTrue(retry.startswith(b'retry: '))
+            name, data = event.decode().strip().split('\n')
+            self.assertEqual(name, 'event: transfer')
+            self.assertEqual(json.loads(data[len('data: '):]), {'type': 'transfer', 'to_account': user_id})
+
+        # A client disconnect cancels the task iterating its response
+        for consumer in consumers:
+            consumer.cancel()
+        await asyncio.gather(*consumers, return_exceptions=True)
+        self.assertEqual(self.broker.subscriber_count(), 0)
+
+    async def test_every_worker_relays_events_to_its_own_streams(self):
+        workers = [redis_broker(self.redis) for _ in range(2)]
+        queues = [worker.subscribe(7) for worker in workers]
+        await self.wait_for(lambda: len(self.redis.listeners) == 2)
+
+        await asyncio.to_thread(redis_broker(self.redis).publish, 7, {'type': 'transfer', 'amount': '5.00'})
+        for events in queues:
+            self.assertEqual(await asyncio.wait_for(events.get(), 5), {'type': 'transfer', 'amount': '5.00'})
+
+    def test_publishing_while_redis_is_down_loses_the_event_quietly(self):
+        broker = redis_broker(mock.Mock(publish=mock.Mock(side_effect=redis.ConnectionError)))
+        with self.assertLogs('banking.events', 'WARNING'):
+            broker.publish(7, {'type': 'transfer'})
+
+    async def test_stream_abandoned_before_its_first_chunk_leaves_no_subscription(self):
+        response = await transaction_events(self.events_request(1))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        del response
+        self.assertEqual(self.broker.subscriber_count(), 0)
+
+
+class TransactionRowEncoderTests(SimpleTestCase):
+    def test_encoder_renders_the_same_bytes_as_the_serializer(self):
+        rows = sample_rows(500)
+        self.assertEqual(encoder_path(rows), serializer_path(rows))
+
+    def test_encoder_renders_missing_values_like_the_serializer(self):
+        row = sample_rows(1)[0]
+        rows = [row[:4] + (None,) + row[5:6] + (None, None)]
+        self.assertEqual(encoder_path(rows), serializer_path(rows))
+
+    def test_microbenchmark_reports_the_encoder_faster(self):
+        output = StringIO()
+        call_command('serializer_benchmark', rows=200, runs=3, min_speedup=1, stdout=output,
+                     skip_checks=True)
+        self.assertIn('output byte-identical', output.getvalue())
+
+
+class BulkRegisterValidationTests(SimpleTestCase):
+    def assertRejected(self, entry, message):
+        fields, error = BulkRegisterAPIView.clean_entry(entry)
+        self.assertIsNone(fields)
+        self.assertIn(message, error)
+
+    def test_valid_entry_is_cleaned(self):
+        fields, error = BulkRegisterAPIView.clean_entry({
+            'username': 'alice', 'password': 's3cret', 'first_name': 'Alice', 'date_of_birth': '1990-02-03',
+        })
+        self.assertIsNone(error)
+        self.assertEqual(fields['username'], 'alice')
+        self.assertEqual(str(fields['date_of_birth']), '1990-02-03')
+
+    def test_missing_credentials(self):
+        self.assertRejected({'username': 'alice'}, "Username and password are required")
+
+    def test_non_string_values(self):
+        self.assertRejected({'username': ['alice'], 'password': 's3cret'}, "username: Must be a string.")
+        self.assertRejected({'username': 'alice', 'password': 12345}, "Password must be a string")
+        self.assertRejected({'username': 'alice', 'password': 's3cret', 'last_name': {}}, "last_name")
+
+    def test_values_longer_than_their_columns(self):
+        self.assertRejected({'username': 'a' * 151, 'password': 's3cret'}, "username:")
+        self.assertRejected({'username': 'alice', 'password': 's3cret', 'first_name': 'A' * 151}, "first_name:")
+
+    def test_invalid_username_and_date(self):
+        self.assertRejected({'username': 'al ice!', 'password': 's3cret'}, "username:")
+        self.assertRejected({'username': 'alice', 'password': 's3cret', 'date_of_birth': '1990-13-40'},
+                            "date_of_birth:")
+
+    def test_open_accounts_flag(self):
+        self.assertIs(parse_flag('false'), False)
+        self.assertIs(parse_flag('true'), True)
+        self.assertIs(parse_flag(False), False)
+        with self.assertRaises(ValueError):
+            parse_flag('yes please')
+        with self.assertRaises(ValueError):
+            parse_flag(1)
+
+
+@override_settings(TOKEN_BUCKET_THROTTLE={'CAPACITY': 60, 'REFILL_RATE': 1})
+class TokenBucketThrottleTests(SimpleTestCase):
+    def setUp(self):
+        # One cache shared by every throttle instance, as the Redis cache is shared by every worker
+        self.cache = LocMemCache('throttle-tests', {})
+        self.cache.clear()
+        # The start of a 60 second window
+        self.now = 1_000_020.0
+        self.request = SimpleNamespace(user=SimpleNamespace(pk=7, is_authenticated=True), method='GET')
+
+    def throttle(self):
+        throttle = TokenBucketThrottle()
+        throttle.cache = self.cache
+        throttle.timer = lambda: self.now
+        return throttle
+
+    def allow(self, cost=1):
+        view = SimpleNamespace(action='list', throttle_costs={'list': cost})
+        return self.throttle().allow_request(self.request, view)
+
+    def test_budget_is_shared_between_throttle_instances(self):
+        self.assertTrue(all(self.allow() for _ in range(60)))
+        self.assertFalse(self.allow())
+
+    def test_rejected_requests_do_not_spend_tokens(self):
+        self.assertTrue(self.allow(cost=55))
+        self.assertFalse(self.allow(cost=10))
+        self.assertTrue(self.allow(cost=5))
+
+    def test_tokens_refill_over_time(self):
+        self.assertTrue(self.allow(cost=60))
+        throttle = self.throttle()
+        self.assertFalse(throttle.allow_request(self.request, SimpleNamespace(action='list', throttle_costs={})))
+        self.assertGreater(throttle.wait(), 0)
+
+        # Halfway through the next window, half of the previous window's spending still counts
+        self.now += 90
+        self.assertTrue(self.allow(cost=30))
+        self.assertFalse(self.allow(cost=1))
+
+    def test_forwarded_for_does_not_give_anonymous_clients_a_fresh_bucket(self):
+        view = SimpleNamespace(action='login', throttle_costs={'login': 60})
+        requests = [SimpleNamespace(user=None, method='POST',
+                                    META={'REMOTE_ADDR': '203.0.113.9', 'HTTP_X_FORWARDED_FOR': f'10.0.0.{n}'})
+                    for n in range(2)]
+        self.assertTrue(self.throttle().allow_request(requests[0], view))
+        self.assertFalse(self.throttle().allow_request(requests[1], view))
+
+    def test_concurrent_requests_cannot_spend_the_same_tokens(self):
+        results = []
+        barrier = threading.Barrier(20)
+
+        def burst():
+            barrier.wait()
+            results.extend(self.allow() for _ in range(10))
+
+        threads = [threading.Thread(target=burst) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results.count(True), 60)
+
+
+class SchemaGenerationTests(SimpleTestCase):
+    def test_schema_generation_introspects_every_view_without_errors(self):
+        from SimpleBanking.schema import generate_schema
+
+        with self.assertNoLogs('drf_yasg', level='WARNING'):
+            document = json.loads(generate_schema())
+        self.assertIn('/accounts/', document['paths'])
+        self.assertIn('/scheduled_transfers/', document['paths'])
+
+
+class ListingCursor:
+    """Stands in for the shard cursor: answers listing queries from in-memory rows, honouring the
+    selected columns and LIMIT/OFFSET, and records the SQL it was given."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def execute(self, sql, params):
+        self.statements.append((sql, params))
+        select = sql[len('SELECT '):sql.index(' FROM ')]
+        columns = [column.rsplit(' AS ', 1)[1] for column in select.split(', ')]
+        self.description = [(column,) for column in columns]
+        positions = [COLUMNS.index(column) for column in columns]
+        rows = [tuple(row[position] for position in positions) for row in self.rows]
+        offset = params[-1] if ' OFFSET %s' in sql else 0
+        limit = params[-2 if offset else -1] if ' LIMIT %s' in sql else None
+        self.result = rows[offset:None if limit is None else offset + limit]
+
+    def fetchall(self):
+        return self.result
+
+
+# Rate limiting is not under test here
+@override_settings(CACHES=LOCMEM_CACHES, TOKEN_BUCKET_THROTTLE={'CAPACITY': 10 ** 6, 'REFILL_RATE': 10 ** 4})
+class TransactionListingTests(SimpleTestCase):
+    PAGE = 2000
+    # What the dashboard asks for: the latest movements of the month, three columns each
+    DASHBOARD_QUERY = {'fields': 'date,amount,description', 'date_from': '2024-06-01', 'limit': '20'}
+
+    def setUp(self):
+        self.cursor = ListingCursor(sample_rows(self.PAGE))
+        patcher = mock.patch('banking.views.shard_cursor', return_value=self.cursor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, query, **headers):
+        request = APIRequestFactory().get('/api/transactions/', query, **headers)
+        force_authenticate(request, user=SimpleNamespace(id=1, pk=1, is_authenticated=True))
+        response = TransactionViewSet.as_view({'get': 'list'})(request)
+        response.render()
+        return GZipMiddleware(lambda request: response)(request)
+
+    def timed(self, query, runs=5):
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            self.get(query)
+            samples.append(time.perf_counter() - started)
+        return statistics.median(samples)
+
+    def test_dashboard_query_is_pushed_down_to_sql(self):
+        self.get(self.DASHBOARD_QUERY)
+        sql, params = self.cursor.statements[-1]
+        self.assertTrue(sql.startswith('SELECT t.date AS date, t.amount AS amount, t.description AS description '))
+        self.assertNotIn('banking_account fa', sql)
+        self.assertIn('t.date >= %s', sql)
+        self.assertIn('ORDER BY t.date DESC, t.id DESC LIMIT %s', sql)
+        self.assertEqual(params[-1], 20)
+
+    def test_listing_reads_each_account_column_through_its_index(self):
+        self.get({'amount_min': '10'})
+        sql, params = self.cursor.statements[-1]
+        self.assertNotIn('banking_transaction', sql)
+        self.assertIn('WHERE t.from_account_id = ANY(ARRAY(', sql)
+        self.assertIn('WHERE t.to_account_id = ANY(ARRAY(', sql)
+        # The owner of the accounts once per branch, then the filters
+        self.assertEqual(params[:2], [1, 1])
+
+    def test_paging_is_ordered_by_default(self):
+        self.get({'limit': '10', 'offset': '10'})
+        sql, _ = self.cursor.statements[-1]
+        self.assertIn('ORDER BY t.date DESC, t.id DESC LIMIT %s OFFSET %s', sql)
+
+    def test_dashboard_payload_is_a_fraction_of_the_full_listing(self):
+        full = self.get({})
+        dashboard = self.get(self.DASHBOARD_QUERY)
+        self.assertEqual(len(json.loads(full.content)), self.PAGE)
+        self.assertEqual(len(json.loads(dashboard.content)), 20)
+        self.assertEqual(set(json.loads(dashboard.content)[0]), {'date', 'amount', 'description'})
+        self.assertLess(len(dashboard.content) * 100, len(full.content))
+
+    def test_large_pages_are_compressed(self):
+        plain = self.get({})
+        compressed = self.get({}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertLess(len(compressed.content) * 4, len(plain.content))
+
+    def test_dashboard_query_is_faster_than_the_full_listing(self):
+        self.assertLess(self.timed(self.DASHBOARD_QUERY) * 10, self.timed({}))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SchemaETagTests(SimpleTestCase):
+    def setUp(self):
+        from SimpleBanking import schema
+
+        self.schema = schema
+        artifact_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(artifact_dir.cleanup)
+        settings_override = override_settings(SCHEMA_ARTIFACT_DIR=artifact_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        schema.load_schema.cache_clear()
+        self.addCleanup(schema.load_schema.cache_clear)
+
+    def test_compressed_schema_keeps_a_strong_etag(self):
+        response = self.client.get('/swagger.json', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response['ETag'].startswith('W/'))
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(response.content))['swagger'], '2.0')
+
+        cached = self.client.get('/swagger.json', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_editing_the_schema_metadata_changes_the_fingerprint(self):
+        read_bytes = Path.read_bytes
+        schema_file = Path(self.schema.__file__)
+        before = self.schema.source_fingerprint()
+        with mock.patch.object(Path, 'read_bytes', autospec=True,
+                               side_effect=lambda path: read_bytes(path) + (b'#' if path == schema_file else b'')):
+            self.assertNotEqual(self.schema.source_fingerprint(), before)
+
+    def test_each_coding_has_its_own_etag(self):
+        plain = self.client.get('/swagger.json')
+        compressed = self.client.get('/swagger.json', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertFalse(plain['ETag'].startswith('W/'))
+        self.assertNotEqual(plain['ETag'], compressed['ETag'])
+        self.assertEqual(plain.content, gzip.decompress(compressed.content))
+
+
+class NextOccurrenceTests(SimpleTestCase):
+    def test_monthly_orders_return_to_their_anchor_day(self):
+        moment = datetime(2025, 1, 31, 9, 30, tzinfo=timezone.utc)
+        anchor_day = anchor_day_of(moment)
+        runs = []
+        for _ in range(4):
+            moment = next_occurrence(moment, ScheduledTransfer.MONTHLY, anchor_day)
+            runs.append(moment.date().isoformat())
+        self.assertEqual(runs, ['2025-02-28', '2025-03-31', '2025-04-30', '2025-05-31'])
+
+    def test_monthly_orders_roll_over_the_year(self):
+        moment = datetime(2024, 12, 15, tzinfo=timezone.utc)
+        self.assertEqual(next_occurrence(moment, ScheduledTransfer.MONTHLY, 15),
+                         datetime(2025, 1, 15, tzinfo=timezone.utc))
+
+
+class DueTransfersTests(SimpleTestCase):
+    def run_batch(self, side_effect):
+        due = datetime(2025, 3, 10, 8, 0, tzinfo=timezone.utc)
+        cursor = mock.MagicMock()
+        cursor.fetchall.return_value = [
+            (order_id, 7, 1000, 2000 + order_id, 10, 'Rent', ScheduledTransfer.MONTHLY, due, 10)
+            for order_id in (1, 2, 3)
+        ]
+        with mock.patch('banking.scheduling.shard_cursor') as shard_cursor, \
+                mock.patch('banking.scheduling.transaction'), \
+                mock.patch('banking.scheduling.execute_transfer', side_effect=side_effect), \
+                self.assertLogs('banking.scheduling', 'ERROR'):
+            shard_cursor.return_value.__enter__.return_value = cursor
+            self.assertEqual(run_shard_due_transfers('default', 10), 3)
+        params = cursor.execute.call_args.args[1]
+        return [tuple(params[i + 1:i + 3]) for i in range(0, len(params), 6)]
+
+    def test_a_failing_order_does_not_stop_the_batch(self):
+        outcomes = self.run_batch([RuntimeError('connection reset'), TransferError('Insufficient funds.'), None])
+        self.assertEqual(outcomes, [
+            (ScheduledTransfer.FAILED, 'connection reset'),
+            (ScheduledTransfer.FAILED, 'Insufficient funds.'),
+            (ScheduledTransfer.SUCCEEDED, None),
+        ])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ShardTransferOutboxTests(SimpleTestCase):
+    """Every ledger row a cross-shard transfer writes is announced in the outbox of its shard."""
+
+    @contextlib.contextmanager
+    def patched(self, cursor):
+        with mock.patch('banking.transfers.shard_cursor') as shard_cursor, \
+                mock.patch('banking.transfers.transaction'), \
+                mock.patch('banking.transfers.record_event') as record_event, \
+                mock.patch('banking.transfers.shard_for_account_number', side_effect=lambda n: f'shard{n % 2}'):
+            shard_cursor.return_value.__enter__.return_value = cursor
+            yield record_event
+
+    def test_debit_records_an_event(self):
+        cursor = mock.MagicMock()
+        # destination exists; source account (id, balance, owner); debit transfer id
+        cursor.fetchone.side_effect = [(1,), (11, 500, 7), (41,)]
+        with self.patched(cursor) as record_event:
+            with mock.patch('banking.transfers.connections') as connections:
+                connections.__getitem__.return_value.in_atomic_block = True
+                execute_transfer(7, 1000, 2001, 25, 'Rent')
+        (_, event_type, payload), = [c.args for c in record_event.call_args_list]
+        self.assertEqual(event_type, OutboxEvent.TRANSFER_DEBITED)
+        self.assertEqual((payload['transfer_id'], payload['from_account'], payload['to_account']), (41, 1000, 2001))
+
+    def test_refund_records_an_event(self):
+        cursor = mock.MagicMock()
+        # source saga row; destination saga row inserted; destination account closed; source marked
+        # compensated; source account id; reversal transfer id
+        cursor.fetchone.side_effect = [
+            (ShardTransfer.DEBITED, 25, 'Rent', 1000, 2001, 7), ('credited',), None, ('id',), (11,), (42,),
+        ]
+        with self.patched(cursor) as record_event:
+            self.assertEqual(complete_shard_transfer('saga', 'shard0'), ShardTransfer.COMPENSATED)
+        (_, event_type, payload), = [c.args for c in record_event.call_args_list]
+        self.assertEqual(event_type, OutboxEvent.TRANSFER_REVERSED)
+        self.assertEqual((payload['transfer_id'], payload['shard_transfer_id']), (42, 'saga'))
+
+    def test_refund_to_a_purged_account_still_finishes_the_saga(self):
+        cursor = mock.MagicMock()
+        # as above, but the source account is gone by the time the refund runs
+        cursor.fetchone.side_effect = [
+            (ShardTransfer.DEBITED, 25, 'Rent', 1000, 2001, 7), ('credited',), None, ('id',), None, (43,),
+        ]
+        with self.patched(cursor) as record_event, self.assertLogs('banking.transfers', 'WARNING'):
+            self.assertEqual(complete_shard_transfer('saga', 'shard0'), ShardTransfer.COMPENSATED)
+        self.assertEqual(record_event.call_args.args[1], OutboxEvent.TRANSFER_REVERSED)
+        self.assertNotIn('balance + ', ' '.join(str(c.args[0]) for c in cursor.execute.call_args_list))
+
+
+@override_settings(BANKING_SHARDS=['shard0', 'shard1'])
+class ShardRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.user = User(pk=3, username='owner')
+        self.user._state.db = 'default'
+
+    def test_standing_orders_are_created_on_the_owners_shard(self):
+        account = Account(pk=8, account_number=10000003, user_id=3)
+        account._state.db = 'shard1'
+        with mock.patch.object(ScheduledTransfer, 'save', autospec=True) as save:
+            order = ScheduledTransferSerializer().create({
+                'user': self.user, 'from_account': account, 'to_account_number': 10000004, 'amount': 10,
+                'interval': ScheduledTransfer.MONTHLY, 'next_run_at': datetime(2025, 1, 31, tzinfo=timezone.utc),
+                'due_at': datetime(2025, 1, 31, tzinfo=timezone.utc), 'anchor_day': 31,
+            })
+        self.assertEqual(save.call_args.kwargs['using'], 'shard1')
+        self.assertEqual(order._state.db, 'shard1')
+
+    def test_rows_assigned_to_a_user_route_to_the_users_shard(self):
+        self.assertEqual(router.db_for_write(ScheduledTransfer, instance=self.user), 'shard1')
+        self.assertEqual(ScheduledTransfer(user=self.user)._state.db, 'shard1')
+        self.assertEqual(router.db_for_write(User, instance=self.user), 'default')
+
+
+class AccountAdminSearchTests(SimpleTestCase):
+    def search(self, term):
+        from django.contrib import admin
+
+        queryset, may_have_duplicates = admin.site._registry[Account].get_search_results(
+            None, Account.objects.all(), term)
+        self.assertFalse(may_have_duplicates)
+        return str(queryset.query) if queryset.query.where else None
+
+    def test_account_numbers_are_looked_up_exactly(self):
+        self.assertIn('WHERE "banking_account"."account_number" = 10000003 ', self.search(' 10000003 '))
+
+    def test_other_terms_match_nothing(self):
+        for term in ('abc', '1e5', str(2 ** 40)):
+            with self.assertRaises(EmptyResultSet):
+                self.search(term)
+
+    def test_no_term_keeps_every_account(self):
+        self.assertIsNone(self.search(''))
@@ -0,0 +1,75 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Token bucket kept in the shared Django cache, one bucket per user (or client address for anonymous requests).
+
+    Every request spends the cost its view declares in ``throttle_costs`` for the current action
+    (or HTTP method on plain API views), defaulting to 1. Buckets hold TOKEN_BUCKET_THROTTLE['CAPACITY']
+    tokens and refill at TOKEN_BUCKET_THROTTLE['REFILL_RATE'] tokens per second.
+
+    The bucket is approximated by a sliding window as long as a full refill: tokens are spent with an atomic
+    ``incr`` on the current window's counter, and the previous window's spending still counts in proportion
+    to how much of it overlaps the sliding window. Concurrent requests from one client, on any worker, can
+    therefore never spend the same tokens twice.
+    """
+    cache = default_cache
+    timer = time.time
+
+    def __init__(self):
+        self.capacity = settings.TOKEN_BUCKET_THROTTLE['CAPACITY']
+        self.refill_rate = settings.TOKEN_BUCKET_THROTTLE['REFILL_RATE']
+        self.retry_after = None
+
+    def get_cost(self, request, view):
+        costs = getattr(view, 'throttle_costs', {})
+        return costs.get(getattr(view, 'action', None) or request.method.lower(), 1)
+
+    def allow_request(self, request, view):
+        if request.user and request.user.is_authenticated:
+            key = f'banking:throttle:user:{request.user.pk}'
+        else:
+            key = f'banking:throttle:anon:{self.get_ident(request)}'
+
+        cost = self.get_cost(request, view)
+        window = self.capacity / self.refill_rate
+        index, elapsed = divmod(self.timer(), window)
+        current_key = f'{key}:{int(index)}'
+        self.cache.add(current_key, 0, int(2 * window) + 1)
+        spent = self.cache.incr(current_key, cost)
+        previous = self.cache.get(f'{key}:{int(index) - 1}', 0)
+        carried = previous * (1 - elapsed / window)
+        if carried + spent <= self.capacity:
+            return True
+
+        # Rejected requests give their tokens back
+        self.cache.decr(current_key, cost)
+        excess = carried + spent - self.capacity
+        self.retry_after = excess * window / previous if excess <= carried else window - elapsed
+        return False
+
+    def wait(self):
+        return self.retry_after
+
+
+class ConcurrencyLimit:
+    """Caps how many requests of one kind a worker serves at once, rejecting the rest with 429."""
+
+    def __init__(self, limit, retry_after):
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(limit)
+
+    def __enter__(self):
+        if not self._slots.acquire(blocking=False):
+            raise Throttled(wait=self.retry_after)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._slots.release()
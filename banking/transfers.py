@@ -0,0 +1,264 @@
+import logging
+import uuid
+
+from django.core.cache import cache
+from django.db import connections, transaction
+from rest_framework import status
+
+from .events import broker
+from .models import OutboxEvent, ShardTransfer
+from .outbox import record_event
+from .sharding import shard_cursor, shard_for_account_number
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_BUCKETS = ('day', 'week', 'month', 'year')
+
+
+class TransferError(Exception):
+    def __init__(self, message, status_code=status.HTTP_400_BAD_REQUEST):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def analytics_cache_key(user_id, bucket):
+    return f'banking:analytics:{user_id}:{bucket}'
+
+
+def invalidate_analytics(*user_ids):
+    cache.delete_many([analytics_cache_key(user_id, bucket)
+                       for user_id in set(user_ids) for bucket in ANALYTICS_BUCKETS])
+
+
+def publish_transfer(from_user_id, to_user_id, from_account_number, to_account_number, amount, description, internal):
+    event = {
+        'type': 'transfer',
+        'from_account': from_account_number,
+        'to_account': to_account_number,
+        'amount': str(amount),
+        'description': description,
+        'internal': internal,
+    }
+    broker.publish(from_user_id, dict(event, direction='outgoing'))
+    broker.publish(to_user_id, dict(event, direction='incoming'))
+
+
+def execute_transfer(user_id, from_account_number, to_account_number, amount, description):
+    """
+    Move `amount` from one of `user_id`'s open accounts to another open account, recording it as a
+    single Transfer row.
+
+    Accounts on the same shard are locked and updated in one transaction. Transfers to another shard
+    are settled as a saga (see `complete_shard_transfer`): when called inside a transaction on the source
+    shard, the settlement runs once that transaction commits.
+
+    Raises TransferError when the transfer is not allowed.
+    """
+    source = shard_for_account_number(from_account_number)
+    target = shard_for_account_number(to_account_number)
+    if source == target:
+        return _execute_local_transfer(source, user_id, from_account_number, to_account_number, amount, description)
+
+    transfer_id = _debit_shard_transfer(source, target, user_id, from_account_number, to_account_number,
+                                        amount, description)
+    if connections[source].in_atomic_block:
+        # robust: a failed settlement stays 'debited' for recover_shard_transfers and must not
+        # break whoever committed the debit
+        transaction.on_commit(lambda: complete_shard_transfer(transfer_id, source), using=source, robust=True)
+        return
+    if complete_shard_transfer(transfer_id, source) == ShardTransfer.COMPENSATED:
+        raise TransferError("The destination account is not available.")
+
+
+def _execute_local_transfer(alias, user_id, from_account_number, to_account_number, amount, description):
+    with transaction.atomic(using=alias), shard_cursor(alias) as cursor:
+        cursor.execute("""
+            SELECT id, balance, user_id, account_number FROM banking_account
+            WHERE account_number IN (%s, %s) AND closed_at IS NULL
+            ORDER BY id
+            FOR UPDATE
+        """, [from_account_number, to_account_number])
+        accounts = {row[3]: row[:3] for row in cursor.fetchall()}
+        from_account = accounts.get(from_account_number)
+        to_account = accounts.get(to_account_number)
+
+        if from_account is None or to_account is None:
+            raise TransferError("One or both accounts do not exist.")
+
+        if from_account[2] != user_id or from_account == to_account:
+            raise TransferError('You do not have permission to perform this action', status.HTTP_403_FORBIDDEN)
+
+        if from_account[1] < amount:
+            raise TransferError("Insufficient funds.")
+
+        internal = from_account[2] == to_account[2]
+
+        transfer_id = _record_transfer(cursor, from_account[0], to_account[0], amount, description, internal)
+
+        record_event(cursor, OutboxEvent.TRANSFER_CREATED, {
+            'transfer_id': transfer_id,
+            'from_account': from_account_number,
+            'to_account': to_account_number,
+            'amount': str(amount),
+            'description': description,
+            'internal': internal,
+        })
+
+        transaction.on_commit(lambda: invalidate_analytics(from_account[2], to_account[2]), using=alias)
+        transaction.on_commit(lambda: publish_transfer(
+            from_account[2], to_account[2], from_account_number, to_account_number, amount, description, internal),
+            using=alias)
+
+
+def _record_transfer(cursor, from_account_id, to_account_id, amount, description, internal):
+    """
+    Move the balances of the given accounts and write the Transfer row. A side is None when its account
+    lives on another shard (or no longer exists). Returns the transfer id.
+    """
+    if from_account_id is not None:
+        cursor.execute("UPDATE banking_account SET balance = balance - %s WHERE id = %s", [amount, from_account_id])
+    if to_account_id is not None:
+        cursor.execute("UPDATE banking_account SET balance = balance + %s WHERE id = %s", [amount, to_account_id])
+    cursor.execute("""
+        INSERT INTO banking_transfer (amount, description, internal, from_account_id, to_account_id, date)
+        VALUES (%s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+        RETURNING id
+    """, [amount, description, internal, from_account_id, to_account_id])
+    return cursor.fetchone()[0]
+
+
+def _debit_shard_transfer(source, target, user_id, from_account_number, to_account_number, amount, description):
+    """Debit the source account and open the saga record on the source shard. Returns the transfer id."""
+    with shard_cursor(target) as cursor:
+        cursor.execute("SELECT 1 FROM banking_account WHERE account_number = %s AND closed_at IS NULL",
+                       [to_account_number])
+        if cursor.fetchone() is None:
+            raise TransferError("One or both accounts do not exist.")
+
+    transfer_id = uuid.uuid4()
+    with transaction.atomic(using=source), shard_cursor(source) as cursor:
+        cursor.execute("""
+            SELECT id, balance, user_id FROM banking_account
+            WHERE account_number = %s AND closed_at IS NULL
+            FOR UPDATE
+        """, [from_account_number])
+        from_account = cursor.fetchone()
+
+        if from_account is None:
+            raise TransferError("One or both accounts do not exist.")
+
+        if from_account[2] != user_id:
+            raise TransferError('You do not have permission to perform this action', status.HTTP_403_FORBIDDEN)
+
+        if from_account[1] < amount:
+            raise TransferError("Insufficient funds.")
+
+        # Accounts of one user share a shard, so a cross-shard transfer is never internal.
+        debit_id = _record_transfer(cursor, from_account[0], None, amount, description, False)
+        record_event(cursor, OutboxEvent.TRANSFER_DEBITED, {
+            'transfer_id': debit_id,
+            'shard_transfer_id': str(transfer_id),
+            'from_account': from_account_number,
+            'to_account': to_account_number,
+            'amount': str(amount),
+            'description': description,
+            'internal': False,
+        })
+        cursor.execute("""
+            INSERT INTO banking_shardtransfer
+            (id, status, amount, description, from_account_number, to_account_number, from_user_id,
+             created_at, updated_at)
+            VALUES (%s, 'debited', %s, %s, %s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+        """, [transfer_id, amount, description, from_account_number, to_account_number, user_id])
+    return transfer_id
+
+
+def complete_shard_transfer(transfer_id, source):
+    """
+    Settle a debited cross-shard transfer: credit the destination on its shard, or refund the source
+    when the destination can no longer accept it. Safe to call again after a crash at any step; the
+    destination shard's saga record decides the outcome.
+
+    Returns the final status of the transfer on the source shard.
+    """
+    with shard_cursor(source) as cursor:
+        cursor.execute("""
+            SELECT status, amount, description, from_account_number, to_account_number, from_user_id
+            FROM banking_shardtransfer WHERE id = %s
+        """, [transfer_id])
+        state, amount, description, from_account_number, to_account_number, from_user_id = cursor.fetchone()
+    if state != ShardTransfer.DEBITED:
+        return state
+
+    target = shard_for_account_number(to_account_number)
+    to_user_id = None
+    with transaction.atomic(using=target), shard_cursor(target) as cursor:
+        cursor.execute("""
+            INSERT INTO banking_shardtransfer
+            (id, status, amount, description, from_account_number, to_account_number, from_user_id,
+             created_at, updated_at)
+            VALUES (%s, 'credited', %s, %s, %s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+            ON CONFLICT (id) DO NOTHING
+            RETURNING status
+        """, [transfer_id, amount, description, from_account_number, to_account_number, from_user_id])
+        if cursor.fetchone() is None:
+            cursor.execute("SELECT status FROM banking_shardtransfer WHERE id = %s", [transfer_id])
+            outcome = cursor.fetchone()[0]
+        else:
+            cursor.execute("""
+                SELECT id, user_id FROM banking_account
+                WHERE account_number = %s AND closed_at IS NULL
+                FOR UPDATE
+            """, [to_account_number])
+            to_account = cursor.fetchone()
+            if to_account is None:
+                outcome = ShardTransfer.COMPENSATED
+                cursor.execute("UPDATE banking_shardtransfer SET status = %s WHERE id = %s", [outcome, transfer_id])
+            else:
+                outcome, to_user_id = ShardTransfer.CREDITED, to_account[1]
+                credit_id = _record_transfer(cursor, None, to_account[0], amount, description, False)
+                record_event(cursor, OutboxEvent.TRANSFER_CREATED, {
+                    'transfer_id': credit_id,
+                    'shard_transfer_id': str(transfer_id),
+                    'from_account': from_account_number,
+                    'to_account': to_account_number,
+                    'amount': str(amount),
+                    'description': description,
+                    'internal': False,
+                })
+
+    with transaction.atomic(using=source), shard_cursor(source) as cursor:
+        final = ShardTransfer.COMPLETED if outcome == ShardTransfer.CREDITED else ShardTransfer.COMPENSATED
+        cursor.execute("""
+            UPDATE banking_shardtransfer SET status = %s, updated_at = CURRENT_TIMESTAMP
+            WHERE id = %s AND status = 'debited'
+            RETURNING id
+        """, [final, transfer_id])
+        if cursor.fetchone() is not None and final == ShardTransfer.COMPENSATED:
+            cursor.execute("SELECT id FROM banking_account WHERE account_number = %s FOR UPDATE",
+                           [from_account_number])
+            from_account = cursor.fetchone()
+            if from_account is None:
+                # Purged while the transfer was pending: the reversal is still written, without an account
+                # to credit, so the saga can finish and the refund can be settled by hand.
+                logger.warning("Shard transfer %s: source account %s no longer exists, reversal not credited",
+                               transfer_id, from_account_number)
+            reversal_id = _record_transfer(cursor, None, from_account[0] if from_account else None, amount, 'Reversal',
+                                           False)
+            record_event(cursor, OutboxEvent.TRANSFER_REVERSED, {
+                'transfer_id': reversal_id,
+                'shard_transfer_id': str(transfer_id),
+                'from_account': from_account_number,
+                'to_account': to_account_number,
+                'amount': str(amount),
+                'description': 'Reversal',
+                'internal': False,
+            })
+
+    if to_user_id is not None:
+        invalidate_analytics(from_user_id, to_user_id)
+        publish_transfer(from_user_id, to_user_id, from_account_number, to_account_number, amount, description, False)
+    elif final == ShardTransfer.COMPENSATED:
+        invalidate_analytics(from_user_id)
+    return final
@@ -1,27 +1,166 @@
-import random
-from io import BytesIO
-
+import asyncio
+import json
+import multiprocessing
+import threading
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+
+import django
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import authenticate, login as auth_login, logout
 from django.contrib.auth.hashers import make_password
-from django.db import transaction, connection
-from django.http import JsonResponse, HttpResponse
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction, IntegrityError
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.middleware.csrf import get_token
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-from rest_framework import status, generics, permissions, viewsets
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import status, generics, permissions, viewsets, serializers
 from rest_framework.decorators import action
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from datetime import datetime
-from .models import User, Transaction
-from .serializers import UserSerializer, AccountSerializer, TransactionSerializer
+from .events import broker
+from .models import User, Account, Transaction, ScheduledTransfer, OutboxEvent
+from .outbox import record_event
+from .scheduling import anchor_day_of, spread
+from .sharding import generate_account_number, shard_cursor, shard_for_user
+from .serializers import UserSerializer, AccountSerializer, TransactionSerializer, TransactionRowEncoder, \
+    ScheduledTransferSerializer
+from .throttling import ConcurrencyLimit
+from .transfers import ANALYTICS_BUCKETS, TransferError, analytics_cache_key, execute_transfer, invalidate_analytics
+
+# The legs of the transfers touching the accounts selected by the `{accounts}` subquery, with the columns of
+# the banking_transaction view. Reads go to banking_transfer directly: each branch filters one account column
+# and is served by its (account, date) index, which filtering the view does not get because of the NULL
+# literal it has for the other account column. The subquery's parameters are passed once per branch.
+ACCOUNT_LEGS_SQL = """(
+    SELECT t.id * 2 AS id, t.date, t.amount, 'withdrawal'::varchar(10) AS transaction_type, t.description,
+           t.internal, t.from_account_id, NULL::integer AS to_account_id
+    FROM banking_transfer t
+    WHERE t.from_account_id = ANY(ARRAY({accounts}))
+    UNION ALL
+    SELECT t.id * 2 + 1, t.date, t.amount, 'deposit', t.description, t.internal, NULL, t.to_account_id
+    FROM banking_transfer t
+    WHERE t.to_account_id = ANY(ARRAY({accounts}))
+) t"""
+
+OPEN_ACCOUNTS_SQL = "SELECT id FROM banking_account WHERE user_id = %s AND closed_at IS NULL"
+
+# Transactions of the open accounts of a user, taking the user id twice
+TRANSACTION_ROWS_SQL = """
+    SELECT t.id, t.date, t.amount, t.transaction_type, t.description, t.internal,
+           fa.account_number AS from_account, ta.account_number AS to_account
+    FROM """ + ACCOUNT_LEGS_SQL.format(accounts=OPEN_ACCOUNTS_SQL) + """
+    LEFT JOIN banking_account fa ON t.from_account_id = fa.id
+    LEFT JOIN banking_account ta ON t.to_account_id = ta.id
+"""
+
+# Columns selectable through `fields=`, keyed by their name in TransactionSerializer
+TRANSACTION_FIELDS = {
+    'id': 't.id',
+    'date': 't.date',
+    'amount': 't.amount',
+    'transaction_type': 't.transaction_type',
+    'description': 't.description',
+    'internal': 't.internal',
+    'from_account': 'fa.account_number',
+    'to_account': 'ta.account_number',
+}
+TRANSACTION_ORDERINGS = {
+    'date': 't.date, t.id',
+    '-date': 't.date DESC, t.id DESC',
+    'amount': 't.amount, t.id',
+    '-amount': 't.amount DESC, t.id DESC',
+}
+
+SEARCH_MIN_LENGTH = 3
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+
+EVENT_STREAM_KEEPALIVE = 15
+EVENT_STREAM_LIFETIME = 60 * 5
+
+statement_renders = ConcurrencyLimit(settings.STATEMENT_RENDER_CONCURRENCY, retry_after=5)
+
+ANALYTICS_CACHE_TIMEOUT = 60 * 10
+
+_hashing_pool = None
+_hashing_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    global _hashing_pool
+    with _hashing_pool_lock:
+        if _hashing_pool is None:
+            # Forking a threaded web worker can copy locks held by other threads into the children.
+            _hashing_pool = ProcessPoolExecutor(max_workers=settings.PASSWORD_HASHING_WORKERS,
+                                                mp_context=multiprocessing.get_context('spawn'),
+                                                initializer=django.setup)
+    return _hashing_pool
+
+
+def parse_moment(value, end_of_day=False):
+    """Parse a datetime, or a bare date meaning the start of that day (or of the next one for `end_of_day`)."""
+    day = parse_date(value)
+    if day is not None:
+        moment = datetime.combine(day + timedelta(days=1) if end_of_day else day, time.min)
+    else:
+        moment = parse_datetime(value)
+        if moment is None:
+            raise ValueError(value)
+    return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+
+
+def parse_boolean(value):
+    if value.lower() not in ('true', 'false', '1', '0'):
+        raise ValueError(value)
+    return value.lower() in ('true', '1')
+
+
+def parse_flag(value):
+    """A JSON boolean, or one of the strings parse_boolean accepts."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        return parse_boolean(value)
+    raise ValueError(value)
+
+
+def parse_transaction_type(value):
+    if value not in dict(Transaction.TRANSACTION_TYPES):
+        raise ValueError(value)
+    return value
+
+
+def parse_positive_int(value):
+    number = int(value)
+    if number < 0:
+        raise ValueError(value)
+    return number
+
+
+# Filter query parameters: each parser returns the SQL condition and its parameter
+TRANSACTION_FILTERS = {
+    'date_from': lambda value: ('t.date >= %s', parse_moment(value)),
+    # A bare date includes the whole day
+    'date_to': lambda value: ('t.date < %s', parse_moment(value, end_of_day=True)) if parse_date(value)
+    else ('t.date <= %s', parse_moment(value)),
+    'amount_min': lambda value: ('t.amount >= %s', Decimal(value)),
+    'amount_max': lambda value: ('t.amount <= %s', Decimal(value)),
+    'type': lambda value: ('t.transaction_type = %s', parse_transaction_type(value)),
+    'internal': lambda value: ('t.internal = %s', parse_boolean(value)),
+}
 
 
 class RegisterAPIView(APIView):
+    throttle_costs = {'post': 10}
+
     def post(self, request):
         username = request.data.get('username')
         password = request.data.get('password')
@@ -44,7 +183,110 @@ class RegisterAPIView(APIView):
         return Response({"success": "User created successfully"}, status=status.HTTP_201_CREATED)
 
 
+class BulkRegisterAPIView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+    throttle_costs = {'post': 30}
+
+    @staticmethod
+    def clean_entry(entry):
+        """Validate one entry against the User fields. Returns the cleaned fields and the error, if any."""
+        if not entry.get('username') or not entry.get('password'):
+            return None, "Username and password are required"
+        if not isinstance(entry['password'], str):
+            return None, "Password must be a string"
+
+        fields = {}
+        for name in ('username', 'first_name', 'last_name', 'date_of_birth'):
+            value = entry.get(name)
+            if value is None or value == '':
+                continue
+            if not isinstance(value, str):
+                return None, f"{name}: Must be a string."
+            try:
+                fields[name] = User._meta.get_field(name).clean(value, None)
+            except DjangoValidationError as error:
+                return None, f"{name}: {' '.join(error.messages)}"
+        return fields, None
+
+    def post(self, request):
+        entries = request.data.get('users')
+        if not isinstance(entries, list):
+            return Response({"error": "A list of users must be provided"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            open_accounts = parse_flag(request.data.get('open_accounts', False))
+        except ValueError:
+            return Response({"error": "open_accounts must be a boolean"}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = [None] * len(entries)
+        candidates = []
+        seen = set()
+        for index, entry in enumerate(entries):
+            entry = entry if isinstance(entry, dict) else {}
+            fields, error = self.clean_entry(entry)
+            if error is None and fields['username'] in seen:
+                error = "Duplicate username in batch"
+            if error:
+                results[index] = {"username": entry.get('username'), "status": "error", "error": error}
+            else:
+                seen.add(fields['username'])
+                candidates.append((index, entry['password'], fields))
+
+        existing = set(User.objects.filter(username__in=seen).values_list('username', flat=True))
+        new_entries = []
+        for index, password, fields in candidates:
+            if fields['username'] in existing:
+                results[index] = {"username": fields['username'], "status": "error",
+                                  "error": "Username already exists"}
+            else:
+                new_entries.append((index, password, fields))
+
+        # Hashing is spread over the pool's processes; the request still waits for every hash.
+        passwords = get_hashing_pool().map(make_password, [password for _, password, _ in new_entries],
+                                           chunksize=32)
+        users = [User(password=password, **fields) for (_, _, fields), password in zip(new_entries, passwords)]
+
+        try:
+            with transaction.atomic():
+                users = User.objects.bulk_create(users, batch_size=1000)
+                if open_accounts:
+                    account_numbers = AccountViewSet.generate_account_numbers([user.id for user in users])
+                    by_shard = defaultdict(list)
+                    for user, number in zip(users, account_numbers):
+                        by_shard[shard_for_user(user.id)].append(
+                            Account(name='Main', balance=0, type=Account.SAVINGS, account_number=number, user=user))
+                    # Each shard commits its accounts before the users on `default` are committed.
+                    for alias, accounts in by_shard.items():
+                        with transaction.atomic(using=alias):
+                            accounts = Account.objects.using(alias).bulk_create(accounts, batch_size=1000)
+                            OutboxEvent.objects.using(alias).bulk_create([
+                                OutboxEvent(event_type=OutboxEvent.ACCOUNT_CREATED, payload={
+                                    'id': account.id,
+                                    'account_number': account.account_number,
+                                    'user_id': account.user_id,
+                                    'name': account.name,
+                                    'type': account.type,
+                                }) for account in accounts
+                            ], batch_size=1000)
+        except IntegrityError:
+            return Response({"error": "Batch conflicts with concurrently registered users, retry it"},
+                            status=status.HTTP_409_CONFLICT)
+
+        for position, ((index, _, _), user) in enumerate(zip(new_entries, users)):
+            results[index] = {"username": user.username, "status": "created", "id": user.id}
+            if open_accounts:
+                results[index]['account_number'] = account_numbers[position]
+
+        return Response({
+            "created": len(users),
+            "failed": len(entries) - len(users),
+            "results": results,
+        }, status=status.HTTP_200_OK)
+
+
 class LoginAPIView(APIView):
+    throttle_costs = {'post': 10}
+
     def get(self, request):
         csrf_token = get_token(request)
         return JsonResponse({'csrf_token': csrf_token})
@@ -74,140 +316,269 @@ class LogoutAPIView(APIView):
         return Response({"success": "Logout"}, status=status.HTTP_200_OK)
 
 
+async def transaction_events(request):
+    user_id = await sync_to_async(lambda: request.user.id if request.user.is_authenticated else None)()
+    if user_id is None:
+        return JsonResponse({"error": "Authentication credentials were not provided."},
+                            status=status.HTTP_403_FORBIDDEN)
+
+    async def stream():
+        # Streams are recycled periodically so abandoned connections cannot pin subscriptions forever;
+        # EventSource clients reconnect transparently. Subscribing here rather than in the view means a
+        # client gone before the first chunk never leaves a subscription behind.
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + EVENT_STREAM_LIFETIME
+        queue = broker.subscribe(user_id)
+        try:
+            yield f"retry: {EVENT_STREAM_KEEPALIVE * 1000}\n\n"
+            while loop.time() < deadline:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=EVENT_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            broker.unsubscribe(user_id, queue)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 class AccountViewSet(viewsets.ModelViewSet):
     serializer_class = AccountSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return Account.objects.none()
         user_id = self.request.user.id
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT * FROM banking_account WHERE user_id = %s", [user_id])
+        with shard_cursor(shard_for_user(user_id)) as cursor:
+            cursor.execute("SELECT * FROM banking_account WHERE user_id = %s AND closed_at IS NULL", [user_id])
             rows = cursor.fetchall()
             accounts = [dict(zip([column[0] for column in cursor.description], row)) for row in rows]
         return accounts
 
     @staticmethod
-    def generate_account_number():
-        return ''.join([str(random.randint(0, 9)) for _ in range(8)])
+    def generate_account_numbers(user_ids):
+        """Unused account numbers for `user_ids`, in the same order, each on the shard of its user."""
+        numbers = [None] * len(user_ids)
+        pending = range(len(user_ids))
+        while pending:
+            candidates = {position: generate_account_number(user_ids[position]) for position in pending}
+            by_shard = defaultdict(set)
+            for position, number in candidates.items():
+                by_shard[shard_for_user(user_ids[position])].add(number)
+            taken = set(numbers)
+            for alias, shard_numbers in by_shard.items():
+                taken.update(Account.objects.using(alias).filter(account_number__in=shard_numbers)
+                             .values_list('account_number', flat=True))
+            pending = []
+            for position, number in candidates.items():
+                if number in taken:
+                    pending.append(position)
+                else:
+                    numbers[position] = number
+                    taken.add(number)
+        return numbers
 
     def destroy(self, request, *args, **kwargs):
         account_id = kwargs.get('pk')
         user_id = self.request.user.id
+        alias = shard_for_user(user_id)
 
-        with connection.cursor() as cursor:
+        with transaction.atomic(using=alias), shard_cursor(alias) as cursor:
             cursor.execute(
-                "SELECT id FROM banking_account WHERE id = %s AND user_id = %s",
+                "UPDATE banking_account SET closed_at = CURRENT_TIMESTAMP "
+                "WHERE id = %s AND user_id = %s AND closed_at IS NULL RETURNING account_number",
                 [account_id, user_id]
             )
             account = cursor.fetchone()
             if not account:
                 return Response({"error": "Account not found or permission denied"}, status=status.HTTP_404_NOT_FOUND)
 
-            cursor.execute(
-                "DELETE FROM banking_transaction WHERE from_account_id = %s OR to_account_id = %s",
-                [account_id, account_id]
-            )
+            cursor.execute("UPDATE banking_scheduledtransfer SET active = false WHERE from_account_id = %s AND active",
+                           [account_id])
 
-            cursor.execute(
-                "DELETE FROM banking_account WHERE id = %s",
-                [account_id]
-            )
+            record_event(cursor, OutboxEvent.ACCOUNT_CLOSED,
+                         {'id': int(account_id), 'account_number': account[0], 'user_id': user_id})
+            # Cached analytics still count the closed account's transactions
+            transaction.on_commit(lambda: invalidate_analytics(user_id), using=alias)
+
+        # The account and its transactions are removed in the background by `manage.py purge_closed_accounts`.
         return Response({"success": "Account and related transactions deleted successfully"},
                         status=status.HTTP_204_NO_CONTENT)
 
     def perform_create(self, serializer):
         user_id = self.request.user.id
         account_data = serializer.validated_data
-        account_number = self.generate_account_number()
+        account_number = generate_account_number(user_id)
+        alias = shard_for_user(user_id)
 
-        with connection.cursor() as cursor:
+        with transaction.atomic(using=alias), shard_cursor(alias) as cursor:
             cursor.execute(
-                "INSERT INTO banking_account (name, balance, type, account_number, user_id) VALUES (%s, %s, %s, %s, %s)",
+                "INSERT INTO banking_account (name, balance, type, account_number, user_id) VALUES (%s, %s, %s, %s, %s) "
+                "RETURNING id",
                 [account_data['name'], 0, account_data['type'], account_number, user_id]
             )
+            record_event(cursor, OutboxEvent.ACCOUNT_CREATED, {
+                'id': cursor.fetchone()[0],
+                'account_number': account_number,
+                'user_id': user_id,
+                'name': account_data['name'],
+                'type': account_data['type'],
+            })
 
 
 class TransactionViewSet(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_costs = {'list': 5, 'analytics': 5, 'search': 5, 'generate_statement': 20}
+
+    def filtered_transactions(self, request, accounts, params, default_ordering=None):
+        """
+        Fetch the transactions of the accounts selected by the `accounts` subquery (taking `params`), narrowed
+        by the request's query parameters:
+        the TRANSACTION_FILTERS, `fields=` (comma separated), `ordering=` and `limit=`/`offset=`.
+        """
+        query_params = request.query_params
+        fields = [field.strip() for field in query_params.get('fields', '').split(',') if field.strip()]
+        if not fields:
+            fields = list(TRANSACTION_FIELDS)
+        elif not set(fields) <= TRANSACTION_FIELDS.keys():
+            raise ValidationError({'fields': f"Must be chosen from: {', '.join(TRANSACTION_FIELDS)}."})
+
+        ordering = query_params.get('ordering', default_ordering)
+        if ordering is not None and ordering not in TRANSACTION_ORDERINGS:
+            raise ValidationError({'ordering': f"Must be one of: {', '.join(TRANSACTION_ORDERINGS)}."})
+
+        conditions = []
+        params = list(params) * 2
+        for name, value in query_params.items():
+            if name not in TRANSACTION_FILTERS:
+                continue
+            try:
+                filter_condition, param = TRANSACTION_FILTERS[name](value)
+            except (ValueError, InvalidOperation):
+                raise ValidationError({name: "Invalid value."})
+            conditions.append(filter_condition)
+            params.append(param)
+
+        sql = "SELECT " + ", ".join(f"{TRANSACTION_FIELDS[field]} AS {field}" for field in fields)
+        sql += " FROM " + ACCOUNT_LEGS_SQL.format(accounts=accounts)
+        if 'from_account' in fields:
+            sql += " LEFT JOIN banking_account fa ON t.from_account_id = fa.id"
+        if 'to_account' in fields:
+            sql += " LEFT JOIN banking_account ta ON t.to_account_id = ta.id"
+        if conditions:
+            sql += " WHERE " + " AND ".join(f"({condition})" for condition in conditions)
+        if ordering is not None:
+            sql += " ORDER BY " + TRANSACTION_ORDERINGS[ordering]
+        for clause in ('limit', 'offset'):
+            if clause in query_params:
+                try:
+                    params.append(parse_positive_int(query_params[clause]))
+                except ValueError:
+                    raise ValidationError({clause: "Must be a non-negative integer."})
+                sql += f" {clause.upper()} %s"
+
+        with shard_cursor(shard_for_user(request.user.id)) as cursor:
+            cursor.execute(sql, params)
+            return TransactionRowEncoder.from_cursor(cursor).encode(cursor.fetchall())
 
     def list(self, request):
         user_id = self.request.user.id
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                SELECT * FROM banking_transaction 
-                WHERE from_account_id IN (SELECT id FROM banking_account WHERE user_id = %s)
-                OR to_account_id IN (SELECT id FROM banking_account WHERE user_id = %s)
-            """, [user_id, user_id])
-            rows = cursor.fetchall()
-            transactions = [dict(zip([column[0] for column in cursor.description], row)) for row in rows]
-
-        transaction_instances = [Transaction(**transaction) for transaction in transactions]
-        serializer = TransactionSerializer(transaction_instances, many=True)
-        return Response(serializer.data)
+        transactions = self.filtered_transactions(request, OPEN_ACCOUNTS_SQL, [user_id], default_ordering='-date')
+        return Response(transactions)
 
     @action(detail=False, methods=['get'], url_path='generate_statement')
     def generate_statement(self, request):
+        with statement_renders:
+            user_id = self.request.user.id
+            with shard_cursor(shard_for_user(user_id)) as cursor:
+                # One line per transfer: a transfer between two of the user's accounts is not split in legs.
+                cursor.execute("""
+                    WITH owned AS (SELECT id FROM banking_account WHERE user_id = %s AND closed_at IS NULL)
+                    SELECT t.id, t.date, t.amount,
+                           CASE WHEN t.from_account_id IN (SELECT id FROM owned)
+                                     AND t.to_account_id IN (SELECT id FROM owned) THEN 'transfer'
+                                WHEN t.from_account_id IN (SELECT id FROM owned) THEN 'withdrawal'
+                                ELSE 'deposit' END AS transaction_type,
+                           t.description, fa.account_number as from_account_number,
+                           ta.account_number as to_account_number, t.internal
+                    FROM banking_transfer t
+                    LEFT JOIN banking_account fa ON t.from_account_id = fa.id
+                    LEFT JOIN banking_account ta ON t.to_account_id = ta.id
+                    WHERE t.from_account_id IN (SELECT id FROM owned) OR t.to_account_id IN (SELECT id FROM owned)
+                    ORDER BY t.date DESC
+                """, [user_id])
+                rows = cursor.fetchall()
+                transactions = [dict(zip([column[0] for column in cursor.description], row)) for row in rows]
+
+            # reportlab is heavy and most workers never render a PDF, so it is only imported on first use
+            from .statements import render_statement
+
+            response = HttpResponse(render_statement(transactions), content_type='application/pdf')
+            response['Content-Disposition'] = 'attachment; filename="transaction_statement.pdf"'
+            return response
+
+    @action(detail=False, methods=['get'])
+    def analytics(self, request):
+        bucket = request.query_params.get('bucket', 'month')
+        if bucket not in ANALYTICS_BUCKETS:
+            raise ValidationError({'bucket': f"Must be one of: {', '.join(ANALYTICS_BUCKETS)}."})
+
         user_id = self.request.user.id
-        with connection.cursor() as cursor:
+        cache_key = analytics_cache_key(user_id, bucket)
+        result = cache.get(cache_key)
+        if result is not None:
+            return Response(result)
+
+        with shard_cursor(shard_for_user(user_id)) as cursor:
             cursor.execute("""
-                SELECT t.id, t.date, t.amount, t.transaction_type, t.description,
-                       fa.account_number as from_account_number,
-                       ta.account_number as to_account_number, t.internal
-                FROM banking_transaction t
-                LEFT JOIN banking_account fa ON t.from_account_id = fa.id
-                LEFT JOIN banking_account ta ON t.to_account_id = ta.id
-                WHERE fa.user_id = %s OR ta.user_id = %s
-                ORDER BY t.date DESC
-            """, [user_id, user_id])
+                SELECT date_trunc(%s, t.date) AS period, t.transaction_type, t.internal, COUNT(*) AS count,
+                       COALESCE(SUM(t.amount) FILTER (WHERE t.transaction_type = 'deposit'), 0),
+                       COALESCE(SUM(t.amount) FILTER (WHERE t.transaction_type = 'withdrawal'), 0)
+                FROM """ + ACCOUNT_LEGS_SQL.format(accounts=OPEN_ACCOUNTS_SQL) + """
+                GROUP BY 1, 2, 3
+                ORDER BY 1
+            """, [bucket, user_id, user_id])
             rows = cursor.fetchall()
-            transactions = [dict(zip([column[0] for column in cursor.description], row)) for row in rows]
-
-        # Create a PDF buffer
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        elements = []
-
-        # Add title
-        styles = getSampleStyleSheet()
-        title = Paragraph("Transaction Statement", styles['Title'])
-        elements.append(title)
-
-        headers = ["ID", "Date", "Amount", "Type", "Description", "From Account", "To Account", "Internal"]
-        data = [headers] + [[
-            str(transaction['id']),
-            transaction['date'].strftime('%Y-%m-%d %H:%M:%S') if isinstance(transaction['date'], datetime) else str(
-                transaction['date']),
-            str(transaction['amount']),
-            str(transaction['transaction_type']),
-            str(transaction['description']),
-            str(transaction['from_account_number']),
-            str(transaction['to_account_number']),
-            str(transaction['internal'])
-        ] for transaction in transactions]
-
-        # Create table
-        table = Table(data)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ]))
-
-        # Add table to elements
-        elements.append(table)
-
-        # Build PDF
-        doc.build(elements)
-
-        buffer.seek(0)
-        response = HttpResponse(buffer, content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="transaction_statement.pdf"'
-        return response
+
+        date_field = serializers.DateTimeField()
+        periods = {}
+        for period, transaction_type, internal, count, incoming, outgoing in rows:
+            totals = periods.setdefault(period, {
+                'count': 0,
+                'incoming': Decimal('0.00'),
+                'outgoing': Decimal('0.00'),
+                'internal': Decimal('0.00'),
+                'external': Decimal('0.00'),
+                'by_type': defaultdict(Decimal),
+            })
+            volume = incoming + outgoing
+            totals['count'] += count
+            totals['incoming'] += incoming
+            totals['outgoing'] += outgoing
+            totals['internal' if internal else 'external'] += volume
+            totals['by_type'][transaction_type] += volume
+
+        result = {
+            'bucket': bucket,
+            'periods': [{
+                'period': date_field.to_representation(period),
+                'count': totals['count'],
+                'incoming': str(totals['incoming']),
+                'outgoing': str(totals['outgoing']),
+                'net': str(totals['incoming'] - totals['outgoing']),
+                'internal': str(totals['internal']),
+                'external': str(totals['external']),
+                'by_type': {key: str(value) for key, value in totals['by_type'].items()},
+            } for period, totals in periods.items()],
+        }
+        cache.set(cache_key, result, ANALYTICS_CACHE_TIMEOUT)
+        return Response(result)
 
     @action(detail=False, methods=['get'], url_path='transactions_account')
     def transactions_account(self, request):
@@ -221,80 +592,85 @@ class TransactionViewSet(viewsets.ViewSet):
             raise NotFound("Account number must be a valid number.")
 
         user_id = self.request.user.id
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                SELECT * FROM banking_transaction 
-                WHERE (from_account_id = (SELECT id FROM banking_account WHERE account_number = %s AND user_id = %s) 
-                OR to_account_id = (SELECT id FROM banking_account WHERE account_number = %s AND user_id = %s))
-                ORDER BY date DESC
-            """, [account_number, user_id, account_number, user_id])
-            rows = cursor.fetchall()
-            transactions = [dict(zip([column[0] for column in cursor.description], row)) for row in rows]
+        transactions = self.filtered_transactions(request, """
+            SELECT id FROM banking_account WHERE account_number = %s AND user_id = %s AND closed_at IS NULL
+        """, [account_number, user_id], default_ordering='-date')
+        return Response(transactions)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        term = request.query_params.get('q', '').strip()
+        if len(term) < SEARCH_MIN_LENGTH:
+            raise ValidationError({'q': f"Must be at least {SEARCH_MIN_LENGTH} characters."})
+
+        try:
+            limit = min(parse_positive_int(request.query_params.get('limit', SEARCH_DEFAULT_LIMIT)), SEARCH_MAX_LIMIT)
+            offset = parse_positive_int(request.query_params.get('offset', 0))
+        except ValueError:
+            raise ValidationError("limit and offset must be non-negative integers.")
+
+        pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        user_id = self.request.user.id
+        with shard_cursor(shard_for_user(user_id)) as cursor:
+            # Both the substring (ILIKE) and the fuzzy (%) match are served by the trigram index on description.
+            cursor.execute(TRANSACTION_ROWS_SQL + """
+                WHERE t.description ILIKE %s OR t.description %% %s
+                ORDER BY similarity(t.description, %s) DESC, t.date DESC, t.id DESC
+                LIMIT %s OFFSET %s
+            """, [user_id, user_id, pattern, term, term, limit, offset])
+            transactions = TransactionRowEncoder.from_cursor(cursor).encode(cursor.fetchall())
 
-        transaction_instances = [Transaction(**transaction) for transaction in transactions]
-        serializer = TransactionSerializer(transaction_instances, many=True)
-        return Response(serializer.data)
+        return Response(transactions)
 
     @action(detail=False, methods=['get'])
     def last_transactions(self, request):
         user_id = self.request.user.id
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                SELECT * FROM banking_transaction 
-                WHERE from_account_id IN (SELECT id FROM banking_account WHERE user_id = %s)
-                OR to_account_id IN (SELECT id FROM banking_account WHERE user_id = %s)
-                ORDER BY date DESC LIMIT 5
+        with shard_cursor(shard_for_user(user_id)) as cursor:
+            cursor.execute(TRANSACTION_ROWS_SQL + """
+                ORDER BY t.date DESC LIMIT 5
             """, [user_id, user_id])
-            rows = cursor.fetchall()
-            transactions = [dict(zip([column[0] for column in cursor.description], row)) for row in rows]
+            transactions = TransactionRowEncoder.from_cursor(cursor).encode(cursor.fetchall())
 
-        transaction_instances = [Transaction(**transaction) for transaction in transactions]
-        serializer = TransactionSerializer(transaction_instances, many=True)
-        return Response(serializer.data)
+        return Response(transactions)
 
     def create(self, request):
         serializer = TransactionSerializer(data=request.data)
         if serializer.is_valid():
             transaction_data = serializer.validated_data
-            amount = transaction_data.get('amount')
-            from_account_number = transaction_data.get('from_account').account_number
-            to_account_number = transaction_data.get('to_account').account_number
-
-            with connection.cursor() as cursor:
-                cursor.execute("SELECT id, balance, user_id FROM banking_account WHERE account_number = %s",
-                               [from_account_number])
-                from_account = cursor.fetchone()
-
-                cursor.execute("SELECT id, balance, user_id FROM banking_account WHERE account_number = %s",
-                               [to_account_number])
-                to_account = cursor.fetchone()
-
-                if from_account[2] != self.request.user.id or from_account == to_account:
-                    return Response({'error': 'You do not have permission to perform this action'},
-                                    status=status.HTTP_403_FORBIDDEN)
-
-                if from_account[1] < amount:
-                    return Response({"error": "Insufficient funds."}, status=status.HTTP_400_BAD_REQUEST)
-
-                internal = from_account[2] == to_account[2]
-
-                with transaction.atomic():
-                    cursor.execute("UPDATE banking_account SET balance = balance - %s WHERE id = %s",
-                                   [amount, from_account[0]])
-                    cursor.execute("""
-                        INSERT INTO banking_transaction 
-                        (amount, transaction_type, description, internal, from_account_id, date) 
-                        VALUES (%s, 'withdrawal', %s, %s, %s, CURRENT_TIMESTAMP)
-                    """, [amount, transaction_data.get('description'), internal, from_account[0]])
-
-                    cursor.execute("UPDATE banking_account SET balance = balance + %s WHERE id = %s",
-                                   [amount, to_account[0]])
-                    cursor.execute("""
-                        INSERT INTO banking_transaction 
-                        (amount, transaction_type, description, internal, to_account_id, date) 
-                        VALUES (%s, 'deposit', %s, %s, %s, CURRENT_TIMESTAMP)
-                    """, [amount, transaction_data.get('description'), internal, to_account[0]])
+            try:
+                execute_transfer(self.request.user.id, transaction_data.get('from_account').account_number,
+                                 transaction_data.get('to_account').account_number, transaction_data.get('amount'),
+                                 transaction_data.get('description'))
+            except TransferError as error:
+                return Response({"error": error.message}, status=error.status_code)
 
             return Response({"success": "Transaction created successfully"}, status=status.HTTP_201_CREATED)
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ScheduledTransferViewSet(viewsets.ModelViewSet):
+    serializer_class = ScheduledTransferSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return ScheduledTransfer.objects.none()
+        return ScheduledTransfer.objects.using(shard_for_user(self.request.user.id)) \
+            .filter(user=self.request.user).select_related('from_account')
+
+    def check_source_account(self, serializer):
+        from_account = serializer.validated_data.get('from_account')
+        if from_account is not None and from_account.user_id != self.request.user.id:
+            raise PermissionDenied('You do not have permission to perform this action')
+
+    def perform_create(self, serializer):
+        self.check_source_account(serializer)
+        next_run_at = serializer.validated_data['next_run_at']
+        serializer.save(user=self.request.user, due_at=spread(next_run_at), anchor_day=anchor_day_of(next_run_at))
+
+    def perform_update(self, serializer):
+        self.check_source_account(serializer)
+        next_run_at = serializer.validated_data.get('next_run_at')
+        serializer.save(**({'due_at': spread(next_run_at), 'anchor_day': anchor_day_of(next_run_at)}
+                           if next_run_at else {}))
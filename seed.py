@@ -2,12 +2,14 @@ import os
 import random
 
 import django
+from django.utils import timezone
 from faker import Faker
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'SimpleBanking.settings')
 django.setup()
 
-from banking.models import User, Account, Transaction
+from banking.models import User, Account, Transfer
+from banking.sharding import generate_account_number, shard_for_user
 
 
 def generate_random_users_and_accounts(num_users=100, output_file='user_credentials.txt'):
@@ -32,32 +34,31 @@ def generate_random_users_and_accounts(num_users=100, output_file='user_credenti
             # Write username and password to the file
             file.write(f"Username: {username}, Password: {password}\n")
 
+            # Accounts and transfers live on the shard of their owner
+            alias = shard_for_user(user.id)
             for _ in range(random.randint(1, 3)):
-                account = Account.objects.create(
+                account = Account.objects.db_manager(alias).create(
                     name=faker.word().capitalize() + ' Account',
                     balance=round(random.uniform(1000, 100000), 2),
                     type=random.choice([Account.SAVINGS, Account.CHECKING]),
-                    account_number=faker.unique.random_number(digits=9),
+                    account_number=generate_account_number(user.id),
                     user=user
                 )
 
                 for _ in range(random.randint(5, 10)):
-                    transaction_type = random.choice(
-                        [Transaction.DEPOSIT, Transaction.WITHDRAWAL, Transaction.TRANSFER])
+                    kind = random.choice(['deposit', 'withdrawal'])
                     amount = round(random.uniform(100, 10000), 2)
                     description = faker.text(max_nb_chars=25)
-                    date = faker.date_time_this_year().strftime('%Y-%m-%d %H:%M:%S')
+                    date = faker.date_time_this_year(tzinfo=timezone.get_current_timezone())
 
-                    Transaction.objects.create(
+                    Transfer.objects.db_manager(alias).create(
                         amount=amount,
-                        transaction_type=transaction_type,
                         description=description,
-                        from_account=account if transaction_type != Transaction.DEPOSIT else None,
-                        to_account=account if transaction_type != Transaction.WITHDRAWAL else None,
+                        from_account=account if kind == 'withdrawal' else None,
+                        to_account=account if kind == 'deposit' else None,
                         internal=random.choice([True, False]),
                         date=date
                     )
 
-
 if __name__ == '__main__':
     generate_random_users_and_accounts(num_users=100)